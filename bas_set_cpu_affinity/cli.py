@@ -4,6 +4,7 @@ This module provides the CLI functionality for the CPU affinity manager.
 
 """
 
+import functools
 import logging
 import sys
 import time
@@ -13,10 +14,15 @@ import psutil
 
 from .core import (
     check_single_instance,
-    move_processes_from_main_cores,
+    cores_to_mask,
+    get_cpu_count,
+    mask_to_cores,
     parse_core_string,
+    parse_names,
+    reconcile,
     set_affinities,
     validate_cores,
+    wait_for_process_exit,
 )
 
 # Configure logging only if it hasn't been configured already
@@ -27,22 +33,26 @@ if not logging.getLogger().handlers:
     )
 logger = logging.getLogger("[cpu_affinity]")
 
+# Minimum number of seconds between the start of two checks when exiting processes wake the monitoring loop early
+MIN_CHECK_GAP = 1.0
 
+
+@functools.lru_cache(maxsize=1)
 def calculate_default_main_cores():
-    """Calculate default main cores based on CPU count."""
-    cpu_count = psutil.cpu_count()
+    """Calculate default main cores based on CPU count, which doesn't change for the lifetime of the process."""
+    cpu_count = get_cpu_count()
 
     # Determine how many cores to allocate to the main process based on total cores
     if cpu_count <= 4:
         # For systems with 4 or fewer cores, allocate 1 core
-        return [0]
+        return (0,)
     if cpu_count <= 8:
         # For systems with 5-8 cores, allocate 2 cores
-        return [0, 1]
+        return (0, 1)
     # For systems with more than 8 cores, allocate 25% of cores (rounded down)
     # but limit to maximum 4 cores
     num_cores = min(4, max(2, cpu_count // 4))
-    return list(range(num_cores))
+    return tuple(range(num_cores))
 
 
 def validate_cores_callback(_ctx, _param, value):
@@ -78,8 +88,13 @@ def validate_cores_callback(_ctx, _param, value):
     help="Comma-separated worker process names (case-insensitive)",
     show_default=True,
 )
+@click.option(
+    "--soft-affinity",
+    is_flag=True,
+    help="Let main processes run on all cores instead of only the main cores",
+)
 @click.option("-v", "--verbose", is_flag=True, help="Enable verbose logging")
-def manage_affinity(main_cores, interval, main_name, workers, verbose):
+def manage_affinity(main_cores, interval, main_name, workers, soft_affinity, verbose):
     """Set CPU affinity for processes with specified core allocations.
 
     main_cores: Hyphen-separated core numbers for the main process (e.g. '0-2-4')
@@ -96,32 +111,44 @@ def manage_affinity(main_cores, interval, main_name, workers, verbose):
     # Process configuration
     main_names = [name.strip() for name in main_name.split(",")]
     worker_names = [w.strip() for w in workers.split(",")]
-    cpu_count = psutil.cpu_count()
+    cpu_count = get_cpu_count()
 
     logger.debug("CPU count: %s", cpu_count)
     logger.debug("Main process names: %s", main_names)
     logger.debug("Worker process names: %s", worker_names)
     logger.debug("Main cores: %s", main_cores)
 
-    # Calculate worker cores
-    worker_cores = [c for c in range(cpu_count) if c not in main_cores]
+    # Calculate worker cores: every core of the system that is not a main core
+    worker_cores = mask_to_cores(((1 << cpu_count) - 1) & ~cores_to_mask(main_cores))
     if not worker_cores:
         logger.error("No cores available for worker processes!")
         raise click.Abort()
 
+    # With soft affinity main processes are not pinned to the main cores; other processes confined to the main cores
+    # are still moved to the worker cores, but nothing else is kept off the main cores
+    main_target_cores = mask_to_cores((1 << cpu_count) - 1) if soft_affinity else main_cores
+
     logger.info("System CPU cores: %s", cpu_count)
-    logger.info("Main processes %s should assign to cores: %s", main_names, main_cores)
+    logger.info("Main processes %s should assign to cores: %s", main_names, main_target_cores)
     logger.info("Worker processes %s should assign to cores: %s", worker_names, worker_cores)
 
-    # Move all processes from main cores to worker cores at startup, except main processes
-    move_processes_from_main_cores(main_cores, worker_cores, main_names)
+    # Split the comma-separated process names once rather than on every check of the monitoring loop
+    main_set = parse_names(main_names)
+    worker_set = parse_names(worker_names)
+
+    # The first check also moves all other processes from main cores to worker cores, in the same single pass over the
+    # processes, later checks only keep the affinities of the main and worker processes up to date
+    check = functools.partial(reconcile, main_set, worker_set, main_target_cores, worker_cores, main_cores)
+    update_affinities = functools.partial(set_affinities, main_set, worker_set, main_target_cores, worker_cores)
 
     # Main monitoring loop
     consecutive_failures = 0
     while True:
+        started = time.monotonic()
         try:
             logger.debug("Checking processes...")
-            main_found, worker_found = set_affinities(main_names, worker_names, main_cores, worker_cores)
+            main_found, worker_found = check()
+            check = update_affinities  # A failed first check is retried on the next one
 
             if main_found or worker_found:
                 consecutive_failures = 0
@@ -130,8 +157,6 @@ def manage_affinity(main_cores, interval, main_name, workers, verbose):
                 if consecutive_failures >= 5:
                     logger.warning("No target processes found for 5 consecutive checks")
                     consecutive_failures = 0
-
-            logger.debug("Sleeping for %s seconds...", interval)
         except KeyboardInterrupt:
             logger.info("Exiting...")
             break
@@ -141,7 +166,21 @@ def manage_affinity(main_cores, interval, main_name, workers, verbose):
         except Exception as e:
             # Catch any unexpected exceptions to prevent the monitoring loop from crashing
             logger.error("Unexpected error in main loop: %s", str(e))
-        time.sleep(interval)
+
+        # Only wait for what is left of the interval, so checks start once per interval however long they take
+        remaining = max(0.0, interval - (time.monotonic() - started))
+        logger.debug("Sleeping for %s seconds...", remaining)
+        try:
+            if wait_for_process_exit(remaining):
+                # Woken up early by an exiting process: processes exiting in quick succession are handled by one check
+                hold = min(interval, MIN_CHECK_GAP) - (time.monotonic() - started)
+                while hold > 0:
+                    wait_for_process_exit(hold)
+                    hold = min(interval, MIN_CHECK_GAP) - (time.monotonic() - started)
+        except KeyboardInterrupt:
+            # The loop spends most of its time waiting, so this is where Ctrl+C usually lands
+            logger.info("Exiting...")
+            break
 
 
 def main():
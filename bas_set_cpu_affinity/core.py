@@ -4,17 +4,99 @@ This module provides the core functions for parsing CPU core specifications and
 
 """
 
+import collections
+import ctypes
+import ctypes.wintypes
+import functools
 import logging
+import os
+import select
 import sys
+import threading
+import time
+from collections.abc import Callable, Collection, Iterable, Sequence
 
 import psutil
-import win32api
-import win32event
-import win32ui
-import winerror
 
 logger = logging.getLogger("[cpu_affinity]")
 
+# Processes seen by set_affinities between polls, keyed by PID: {pid: (lowercased name, psutil.Process)}
+# The Process object may be None until the process matches one of the names whose affinity is managed
+_PROC_CACHE: dict[int, tuple[str, psutil.Process | None]] = {}
+
+# On Linux, process names are read from /proc/<pid>/comm directly instead of through psutil
+_USE_PROCFS = sys.platform.startswith("linux")
+_COMM_MAX_LENGTH = 15  # The kernel truncates longer names in /proc/<pid>/comm
+
+# On Windows, the PIDs and names of all processes are read with a single NtQuerySystemInformation call
+_USE_NT_PROCESS_LIST = sys.platform == "win32"
+_SYSTEM_PROCESS_INFORMATION = 5
+_STATUS_INFO_LENGTH_MISMATCH = 0xC0000004
+
+# Affinity last applied to a process and when it was checked, keyed by (pid, create_time) so that a reused PID is never
+# mistaken for the old one. The affinity isn't read again for _LAST_AFFINITY_TTL seconds, after which it is checked and
+# restored if something else changed it. The least recently seen entries are evicted past _LAST_AFFINITY_MAX_SIZE, so
+# the memo stays small as processes come and go while the long-lived main and worker processes stay remembered.
+_LAST_AFFINITY: collections.OrderedDict[tuple[int, float], tuple[int, float]] = collections.OrderedDict()
+_LAST_AFFINITY_MAX_SIZE = 4096
+_LAST_AFFINITY_TTL = 30.0
+
+# On Linux, pidfds of the processes whose affinity was applied, used to wake the monitoring loop when one of them exits
+_PIDFDS: dict[int, int] = {}
+_EPOLL = None
+_PIDFDS_SUPPORTED = sys.platform.startswith("linux") and hasattr(os, "pidfd_open")
+# PIDs whose pidfd already signalled an exit. A process that exited but wasn't reaped yet is still listed, and a new
+# pidfd for it would be readable at once, so none is opened again until the PID leaves the listing.
+_EXITED_PIDS: set[int] = set()
+
+# On Windows, affinities are set through kernel32 directly instead of through psutil
+_USE_WIN32_API = sys.platform == "win32"
+_PROCESS_SET_INFORMATION = 0x0200
+_PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+_ERROR_ALREADY_EXISTS = 183
+_MB_OK = 0x0
+_AFFINITY_MASK_BITS = ctypes.sizeof(ctypes.c_size_t) * 8
+
+# Handles of the processes whose affinity is managed, kept open between polls and closed once the process is gone
+# An open handle also prevents the PID from being reused while it is cached
+_PROCESS_HANDLES: dict[int, int] = {}
+
+# Guards the changes the thread pool makes to _PROC_CACHE, _LAST_AFFINITY and _PROCESS_HANDLES. Refreshing and clearing
+# the caches happen on the calling thread while the pool is idle.
+_CACHE_LOCK = threading.Lock()
+
+# On Linux, affinities are read and set with the sched_*affinity syscalls directly instead of through psutil
+_USE_SCHED_AFFINITY = sys.platform.startswith("linux") and hasattr(os, "sched_setaffinity")
+
+
+@functools.lru_cache(maxsize=1)
+def _user32():
+    """Load user32, declaring the prototype of MessageBoxW."""
+    user32 = ctypes.WinDLL("user32", use_last_error=True)  # type: ignore[attr-defined]
+    user32.MessageBoxW.argtypes = (
+        ctypes.wintypes.HWND,
+        ctypes.wintypes.LPCWSTR,
+        ctypes.wintypes.LPCWSTR,
+        ctypes.wintypes.UINT,
+    )
+    user32.MessageBoxW.restype = ctypes.c_int
+    return user32
+
+
+def _message_box(text, title):
+    """Display a message box with an OK button and wait until it is closed."""
+    _user32().MessageBoxW(None, text, title, _MB_OK)
+
+
+def _create_mutex(name):
+    """Create a named mutex with CreateMutexW, returning its handle and whether the mutex already existed."""
+    kernel32 = _kernel32()
+    handle = kernel32.CreateMutexW(None, False, name)
+    last_error = ctypes.get_last_error()  # type: ignore[attr-defined]
+    if not handle:
+        raise OSError(last_error, f"CreateMutexW failed with error {last_error}")
+    return handle, last_error == _ERROR_ALREADY_EXISTS
+
 
 def check_single_instance():
     """Check if another instance of the application is already running.
@@ -26,10 +108,9 @@ def check_single_instance():
     mutex_name = "Global\\BAS_CPU_Affinity_Manager_Mutex"
 
     try:
-        # Attempt to create a mutex
-        mutex = win32event.CreateMutex(None, False, mutex_name)
-        # Check if the mutex already exists
-        if win32api.GetLastError() == winerror.ERROR_ALREADY_EXISTS:
+        # Attempt to create a mutex, and check if it already exists
+        mutex, already_exists = _create_mutex(mutex_name)
+        if already_exists:
             error_message = (
                 "Another instance of the application is already running.\n"
                 "Please close the existing instance before starting a new one."
@@ -38,7 +119,7 @@ def check_single_instance():
 
             # Display a message box that will be visible when double-clicking the exe
             try:
-                win32ui.MessageBox(error_message, "BAS CPU Affinity Manager - Error", 0)
+                _message_box(error_message, "BAS CPU Affinity Manager - Error")
             except Exception as msg_err:
                 logger.error("Failed to display message box: %s", str(msg_err))
 
@@ -52,7 +133,7 @@ def check_single_instance():
 
         # Display a message box for the error
         try:
-            win32ui.MessageBox(error_message, "BAS CPU Affinity Manager - Error", 0)
+            _message_box(error_message, "BAS CPU Affinity Manager - Error")
         except Exception as msg_err:
             logger.error("Failed to display message box: %s", str(msg_err))
 
@@ -60,143 +141,705 @@ def check_single_instance():
         return None
 
 
-def parse_core_string(core_str):
-    """Parse a core specification string into a sorted list of unique integers."""
+@functools.lru_cache(maxsize=1)
+def get_cpu_count():
+    """Return the number of logical CPUs, which doesn't change for the lifetime of the process."""
+    return psutil.cpu_count()
+
+
+def cores_to_mask(cores: Iterable[int]) -> int:
+    """Convert core numbers into an integer bitmask with bit N set for core N.
+
+    Comparing masks is a single integer comparison, regardless of the order and duplicates of the core numbers.
+
+    """
+    mask = 0
+    for core in cores:
+        mask |= 1 << core
+    return mask
+
+
+def mask_to_cores(mask: int) -> tuple[int, ...]:
+    """Convert an integer bitmask back into a sorted tuple of core numbers."""
+    return tuple(core for core in range(mask.bit_length()) if mask >> core & 1)
+
+
+def parse_core_string(core_str: str) -> tuple[int, ...]:
+    """Parse a core specification string into a sorted tuple of unique integers.
+
+    The tuple is immutable and hashable, so the parsed cores can be shared and used as a cache key.
+
+    """
     try:
-        cores = list({int(c) for c in core_str.split("-")})
-        return sorted(cores)
+        return tuple(sorted({int(c) for c in core_str.split("-")}))
     except ValueError as exc:
         raise ValueError("Invalid core format. Use hyphen-separated numbers (e.g. '0-2-4')") from exc
 
 
-def move_processes_from_main_cores(main_cores, worker_cores, main_names=None):
+def parse_names(names: str | Iterable[str]) -> frozenset[str]:
+    """Parse process names, given as a comma-separated string or as separate names, for case-insensitive matching.
+
+    The names are stripped, lowercased and interned. Process names are interned too when they are cached, so matching
+    them against the returned set mostly comes down to an identity check.
+
+    """
+    if isinstance(names, str):
+        names = names.split(",")
+    return frozenset(sys.intern(name.strip().lower()) for name in names)
+
+
+def _name_set(names: str | Iterable[str] | None) -> frozenset[str]:
+    """Return process names as a set for matching, normalised like parse_names does."""
+    return parse_names(names) if names is not None else frozenset()
+
+
+def move_processes_from_main_cores(
+    main_cores: Collection[int], worker_cores: Collection[int], main_names: str | Iterable[str] | None = None
+) -> None:
     """Move all processes from main cores to worker cores, except main processes.
 
     This function identifies all processes currently running on the main CPU cores and moves them to the worker cores to
     free up resources for the main process. Main processes (specified by main_names) are not moved.
 
     """
+    main_names = _name_set(main_names)
     if not worker_cores:
         logger.warning("No worker cores available to move processes to")
         return
 
-    logger.info("Moving processes from main cores %s to worker cores %s", main_cores, worker_cores)
+    main_mask = cores_to_mask(main_cores)
+    worker_mask = cores_to_mask(worker_cores)
+    if not main_mask & ~worker_mask:
+        logger.info("Worker cores %s include all main cores %s, no processes to move", worker_cores, main_cores)
+        return
 
-    # Convert main_names to a list if it's a string
-    if isinstance(main_names, str):
-        main_names = [name.strip() for name in main_names.split(",")]
+    logger.info("Moving processes from main cores %s to worker cores %s", main_cores, worker_cores)
 
-    # If main_names is None, use an empty list
-    if main_names is None:
-        main_names = []
+    # Checked once per sweep, so the per-process debug messages cost nothing when debug logging is disabled
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
 
     moved_count = 0
-    for proc in psutil.process_iter(["pid", "name"]):
+    # Only the name is prefetched, proc.pid is a plain attribute. Since psutil 6.0 process_iter no longer queries the
+    # creation time of every PID to detect PID reuse, which used to dominate the cost of this sweep.
+    for proc in psutil.process_iter(attrs=["name"]):
         try:
             # Skip system processes that might cause issues if moved
             if proc.pid <= 4:  # System processes on Windows
                 continue
 
-            proc_name = proc.info["name"]
-
-            # Skip main processes - don't move them from main cores
-            if any(proc_name.lower() == main.lower() for main in main_names):
-                logger.debug("Skipping main process %s (PID: %s) - keeping on main cores", proc_name, proc.pid)
-                continue
-
-            current_affinity = proc.cpu_affinity()
-
-            # Check if the process is running exclusively on main cores
-            if all(core in main_cores for core in current_affinity):
-                logger.debug(
-                    "Found process %s (PID: %s) running on main cores: %s", proc_name, proc.pid, current_affinity
-                )
-
-                # Set new affinity to worker cores
-                proc.cpu_affinity(worker_cores)
-                logger.debug("Moved process %s (PID: %s) to worker cores: %s", proc_name, proc.pid, worker_cores)
-                moved_count += 1
+            # Batch the name and affinity queries into a single cached read of the process state
+            with proc.oneshot():
+                proc_name = proc.info["name"]  # type: ignore[attr-defined]
+
+                # Skip main processes - don't move them from main cores
+                if proc_name.lower() in main_names:
+                    if debug_enabled:
+                        logger.debug("Skipping main process %s (PID: %s) - keeping on main cores", proc_name, proc.pid)
+                    continue
+
+                # Check if the process is running exclusively on main cores
+                current_mask = _read_affinity_mask(proc)
+                if current_mask and not current_mask & ~main_mask:
+                    if debug_enabled:
+                        logger.debug(
+                            "Found process %s (PID: %s) running on main cores: %s",
+                            proc_name,
+                            proc.pid,
+                            mask_to_cores(current_mask),
+                        )
+
+                    # Set new affinity to worker cores
+                    _write_affinity(proc, worker_cores, worker_mask)
+                    if debug_enabled:
+                        logger.debug(
+                            "Moved process %s (PID: %s) to worker cores: %s", proc_name, proc.pid, worker_cores
+                        )
+                    moved_count += 1
 
         except (psutil.NoSuchProcess, psutil.AccessDenied):
             pass  # Process disappeared or we don't have permissions
         except (AttributeError, OSError) as e:
-            logger.debug("Error accessing process: %s", e)
+            if debug_enabled:
+                logger.debug("Error accessing process: %s", e)
+        finally:
+            _close_process_handle(proc.pid)  # The affinity of this process isn't checked again
 
     logger.info("Moved %d processes from main cores to worker cores", moved_count)
 
 
-def set_affinities(main_names, worker_names, main_cores, worker_cores):
-    """Update CPU affinities for all matching processes."""
-    # Convert main_names to a list if it's a string
-    if isinstance(main_names, str):
-        main_names = [name.strip() for name in main_names.split(",")]
+def _read_comm(pid):
+    """Return the name of a process from /proc/<pid>/comm.
 
-    logger.debug("Looking for main processes: %s", main_names)
-    logger.debug("Looking for worker processes: %s", worker_names)
+    Returns None when the name may have been truncated by the kernel or can't be read, in which case psutil, which
+    recovers full names from the command line, has to be used instead.
 
-    main_processes_found = False
-    worker_processes_found = False
+    """
+    try:
+        with open(f"/proc/{pid}/comm", encoding="utf-8", errors="replace") as comm:
+            name = comm.read().rstrip("\n")
+    except OSError:
+        return None
+    return name if len(name) < _COMM_MAX_LENGTH else None
+
+
+class _UnicodeString(ctypes.Structure):
+    """The UNICODE_STRING structure of the Windows native API."""
+
+    _fields_ = [
+        ("Length", ctypes.c_ushort),
+        ("MaximumLength", ctypes.c_ushort),
+        ("Buffer", ctypes.c_void_p),
+    ]
+
+
+class _SystemProcessInformation(ctypes.Structure):
+    """The leading fields of a SYSTEM_PROCESS_INFORMATION entry, up to the PID."""
+
+    _fields_ = [
+        ("NextEntryOffset", ctypes.c_uint32),
+        ("NumberOfThreads", ctypes.c_uint32),
+        ("WorkingSetPrivateSize", ctypes.c_int64),
+        ("HardFaultCount", ctypes.c_uint32),
+        ("NumberOfThreadsHighWatermark", ctypes.c_uint32),
+        ("CycleTime", ctypes.c_uint64),
+        ("CreateTime", ctypes.c_int64),
+        ("UserTime", ctypes.c_int64),
+        ("KernelTime", ctypes.c_int64),
+        ("ImageName", _UnicodeString),
+        ("BasePriority", ctypes.c_int32),
+        ("UniqueProcessId", ctypes.c_void_p),
+    ]
+
+
+@functools.lru_cache(maxsize=1)
+def _ntdll():
+    """Load ntdll, declaring the prototype of NtQuerySystemInformation."""
+    ntdll = ctypes.WinDLL("ntdll")  # type: ignore[attr-defined]
+    ntdll.NtQuerySystemInformation.argtypes = (
+        ctypes.c_ulong,
+        ctypes.c_void_p,
+        ctypes.c_ulong,
+        ctypes.POINTER(ctypes.c_ulong),
+    )
+    ntdll.NtQuerySystemInformation.restype = ctypes.c_ulong
+    return ntdll
+
+
+def _list_processes_nt():
+    """Return the names of all running processes, keyed by PID, from a single NtQuerySystemInformation call.
+
+    psutil makes the same call but only keeps the entry of the process it was asked about. Raises OSError when the
+    call fails, in which case psutil has to be used instead.
 
-    for proc in psutil.process_iter(["name", "pid"]):
+    """
+    ntdll = _ntdll()
+    size = ctypes.c_ulong(0x40000)
+    while True:
+        buffer = ctypes.create_string_buffer(size.value)
+        status = ntdll.NtQuerySystemInformation(_SYSTEM_PROCESS_INFORMATION, buffer, size, ctypes.byref(size))
+        if status != _STATUS_INFO_LENGTH_MISMATCH:
+            break
+        # Processes may start between the two calls, leave some headroom
+        size.value += 0x10000
+    if status:
+        raise OSError(f"NtQuerySystemInformation failed with status {status:#x}")
+
+    names = {}
+    address = ctypes.addressof(buffer)
+    while True:
+        entry = _SystemProcessInformation.from_address(address)
+        image_name = entry.ImageName
+        name = ctypes.string_at(image_name.Buffer, image_name.Length).decode("utf-16-le") if image_name.Buffer else ""
+        names[entry.UniqueProcessId or 0] = name
+        if not entry.NextEntryOffset:
+            return names
+        address += entry.NextEntryOffset
+
+
+def _list_process_names():
+    """Return the names of all running processes keyed by PID, or None if they can't be listed in one call."""
+    if _USE_NT_PROCESS_LIST:
         try:
-            proc_name = proc.info["name"]
-            # logger.debug("Checking process: %s (PID: %s)", proc_name, proc.info["pid"])
-
-            if any(proc_name.lower() == main.lower() for main in main_names):
-                logger.debug("Found main process: %s (PID: %s)", proc_name, proc.info["pid"])
-                handle_main_process(proc, main_cores)
-                main_processes_found = True
-            elif any(proc_name.lower() == worker.lower() for worker in worker_names):
-                logger.debug("Found worker process: %s (PID: %s)", proc_name, proc.info["pid"])
-                handle_worker_process(proc, worker_cores)
-                worker_processes_found = True
+            return _list_processes_nt()
+        except OSError as e:
+            logger.debug("Error listing processes: %s", e)
+    return None
+
+
+def _name_changed(pid: int, cached_name: str, names: dict[int, str] | None) -> bool:
+    """Return whether a cached PID now belongs to a process with another name.
+
+    This happens when the PID was reused by a new process, or when the process called exec. The name comes from the
+    native process list on Windows and from /proc/<pid>/comm on Linux.
 
+    """
+    name = names[pid] if names is not None else _read_comm(pid)
+    if name is None:
+        # The name may have been truncated in /proc/<pid>/comm, which is only expected if the cached name was too long
+        return len(cached_name) < _COMM_MAX_LENGTH
+    return bool(name) and name.lower() != cached_name  # The System Idle Process has no image name, psutil names it
+
+
+def _refresh_process_cache() -> None:
+    """Synchronise the process cache with the PIDs that are currently running.
+
+    Only PIDs that appeared since the previous refresh are resolved, and PIDs that are gone are dropped. This avoids
+    re-creating Process objects for hundreds of unchanged processes on every poll. On Windows the names of all processes
+    come from a single native call, on Linux the name is read from /proc/<pid>/comm, and cached PIDs whose name changed
+    are resolved again. Either way the Process object is only created once the process matches. Names are lowercased
+    and interned once, so the many processes sharing a name share one string.
+
+    """
+    names = _list_process_names()
+    current = set(names) if names is not None else set(psutil.pids())  # On Linux psutil.pids() just lists /proc
+
+    for pid in _PROC_CACHE.keys() - current:
+        del _PROC_CACHE[pid]
+
+    if names is not None or _USE_PROCFS:
+        for pid, (cached_name, _) in list(_PROC_CACHE.items()):
+            if _name_changed(pid, cached_name, names):
+                del _PROC_CACHE[pid]
+                _close_process_handle(pid)
+
+    for pid in _PROCESS_HANDLES.keys() - current:
+        _close_process_handle(pid)
+
+    for key in [key for key in _LAST_AFFINITY if key[0] not in current]:
+        del _LAST_AFFINITY[key]
+
+    _EXITED_PIDS.intersection_update(current)
+
+    for pid in current - _PROC_CACHE.keys():
+        if names is not None:
+            name = names[pid]
+        else:
+            name = _read_comm(pid) if _USE_PROCFS else None
+        if name:  # The System Idle Process has no image name, psutil names it
+            _PROC_CACHE[pid] = (sys.intern(name.lower()), None)
+            continue
+        try:
+            proc = psutil.Process(pid)
+            _PROC_CACHE[pid] = (sys.intern(proc.name().lower()), proc)
         except (psutil.NoSuchProcess, psutil.AccessDenied):
-            pass  # Process disappeared or we don't have permissions
-        except (AttributeError, OSError) as e:
-            logger.debug("Error accessing process: %s", e)
+            pass  # Process disappeared or we don't have permissions, retry on the next refresh
+
+
+def _cached_process(pid: int, proc_name: str) -> psutil.Process:
+    """Create the Process object of a cached process whose name has only been read from /proc so far."""
+    proc = psutil.Process(pid)
+    with _CACHE_LOCK:
+        _PROC_CACHE[pid] = (proc_name, proc)
+    return proc
+
+
+@functools.lru_cache(maxsize=1)
+def _get_executor():
+    """Return the thread pool that applies affinities, created on first use and kept across polls.
+
+    concurrent.futures is only imported here, so starting the CLI (or just showing its help) doesn't pay for it.
+
+    """
+    import concurrent.futures  # pylint: disable=import-outside-toplevel
+
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(8, get_cpu_count() or 1), thread_name_prefix="affinity"
+    )
+
+
+# An affinity handler to run for a cached process: (handler, pid, name, Process or None, target cores, target mask,
+# whether a Process object created for it is kept in the cache)
+_Job = tuple[Callable[..., None], int, str, psutil.Process | None, Collection[int], int, bool]
+
+
+def _handle_cached_process(job: _Job) -> bool:
+    """Run an affinity handler for a cached process, returning whether the process was handled."""
+    handler, pid, proc_name, proc, target_cores, target_mask, keep = job
+    try:
+        if proc is None:
+            # Processes that are only moved once don't need a Process object on later polls
+            proc = _cached_process(pid, proc_name) if keep else psutil.Process(pid)
+        handler(proc, target_cores, target_mask)
+        return True
+    except psutil.NoSuchProcess:
+        # The process exited (or its PID was reused), resolve the PID again on the next refresh
+        with _CACHE_LOCK:
+            _PROC_CACHE.pop(pid, None)
+        _close_process_handle(pid)
+    except psutil.AccessDenied:
+        pass  # We don't have permissions
+    except (AttributeError, OSError) as e:
+        logger.debug("Error accessing process: %s", e)
+    return False
+
+
+def _move_off_main_cores(
+    proc: psutil.Process, worker_cores: Collection[int], worker_mask: int, main_mask: int, moved: list[int]
+) -> None:
+    """Move a process running exclusively on the main cores to the worker cores, recording its PID in moved."""
+    with proc.oneshot():
+        current_mask = _read_affinity_mask(proc)
+        if not current_mask or current_mask & ~main_mask:
+            return
+
+        _write_affinity(proc, worker_cores, worker_mask)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Moved process %s from main cores %s to worker cores: %s",
+            proc.pid,
+            mask_to_cores(current_mask),
+            worker_cores,
+        )
+    moved.append(proc.pid)
+
+
+def _reconcile(
+    main_names: frozenset[str],
+    worker_names: frozenset[str],
+    main_cores: Collection[int],
+    worker_cores: Collection[int],
+    reserved_cores: Collection[int] | None,
+) -> tuple[bool, bool]:
+    """Update CPU affinities for all matching processes, and move other processes off the reserved cores if given.
+
+    Processes are collected first, then handled concurrently on a small thread pool when there are several of them, so
+    the latency of the affinity syscalls overlaps.
+
+    """
+    logger.debug("Looking for main processes: %s", sorted(main_names))
+    logger.debug("Looking for worker processes: %s", sorted(worker_names))
+
+    # Resolved once per poll rather than per process in the loop below
+    main_mask = cores_to_mask(main_cores)
+    worker_mask = cores_to_mask(worker_cores)
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    handle_main = handle_main_process
+    handle_worker = handle_worker_process
+    moved: list[int] = []
+    move = None
+    reserved_mask = cores_to_mask(reserved_cores or ())
+    if reserved_mask & ~worker_mask:  # Moving processes can't free the reserved cores if the worker cores include them
+        move = functools.partial(_move_off_main_cores, main_mask=reserved_mask, moved=moved)
+
+    _refresh_process_cache()
+
+    # A single lookup classifies each process, a name listed as both main and worker is handled as main
+    roles = dict.fromkeys(worker_names, "worker")
+    roles.update(dict.fromkeys(main_names, "main"))
+
+    main_jobs: list[_Job] = []
+    worker_jobs: list[_Job] = []
+    other_jobs: list[_Job] = []
+    for pid, (proc_name, proc) in list(_PROC_CACHE.items()):
+        role = roles.get(proc_name)
+        if role == "main":
+            if debug_enabled:
+                logger.debug("Found main process: %s (PID: %s)", proc_name, pid)
+            main_jobs.append((handle_main, pid, proc_name, proc, main_cores, main_mask, True))
+        elif role == "worker":
+            if debug_enabled:
+                logger.debug("Found worker process: %s (PID: %s)", proc_name, pid)
+            worker_jobs.append((handle_worker, pid, proc_name, proc, worker_cores, worker_mask, True))
+        elif move is not None and pid > 4:  # Skip system processes that might cause issues if moved
+            other_jobs.append((move, pid, proc_name, proc, worker_cores, worker_mask, False))
+
+    jobs = main_jobs + worker_jobs + other_jobs
+    if len(jobs) > 1:
+        handled = list(_get_executor().map(_handle_cached_process, jobs))
+    else:
+        handled = [_handle_cached_process(job) for job in jobs]
+
+    main_processes_found = any(handled[: len(main_jobs)])
+    worker_processes_found = any(handled[len(main_jobs) : len(main_jobs) + len(worker_jobs)])
+
+    # Other processes are only moved once, their handles aren't needed anymore
+    for job in other_jobs:
+        _close_process_handle(job[1])
+
+    if move is not None:
+        logger.info("Moved %d processes from main cores to worker cores", len(moved))
 
     # Log if no processes were found
     if not main_processes_found:
-        logger.warning("No main processes found matching: %s", main_names)
+        logger.warning("No main processes found matching: %s", sorted(main_names))
     if not worker_processes_found:
-        logger.warning("No worker processes found matching: %s", worker_names)
+        logger.warning("No worker processes found matching: %s", sorted(worker_names))
 
     return main_processes_found, worker_processes_found
 
 
-def handle_main_process(proc, target_cores):
+def set_affinities(
+    main_names: str | Iterable[str],
+    worker_names: str | Iterable[str],
+    main_cores: Collection[int],
+    worker_cores: Collection[int],
+) -> tuple[bool, bool]:
+    """Update CPU affinities for all matching processes."""
+    return _reconcile(_name_set(main_names), _name_set(worker_names), main_cores, worker_cores, None)
+
+
+def reconcile(
+    main_names: str | Iterable[str],
+    worker_names: str | Iterable[str],
+    main_cores: Collection[int],
+    worker_cores: Collection[int],
+    reserved_cores: Collection[int],
+) -> tuple[bool, bool]:
+    """Update CPU affinities for all matching processes and move every other process off the reserved cores.
+
+    This does the work of move_processes_from_main_cores and set_affinities in a single pass over the processes, so
+    the processes are only listed once at startup. Processes other than the main and worker ones are moved to the
+    worker cores when they run exclusively on the reserved cores.
+
+    """
+    return _reconcile(_name_set(main_names), _name_set(worker_names), main_cores, worker_cores, reserved_cores)
+
+
+def clear_caches() -> None:
+    """Drop the processes cached by set_affinities and reconcile, and the affinities remembered for them."""
+    _PROC_CACHE.clear()
+    _LAST_AFFINITY.clear()
+    _EXITED_PIDS.clear()
+    _close_pidfds()
+    for pid in list(_PROCESS_HANDLES):
+        _close_process_handle(pid)
+
+
+@functools.lru_cache(maxsize=1)
+def _kernel32():
+    """Load kernel32, declaring the prototypes of the functions used to create the mutex and manage affinities."""
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)  # type: ignore[attr-defined]
+    kernel32.OpenProcess.argtypes = (ctypes.wintypes.DWORD, ctypes.wintypes.BOOL, ctypes.wintypes.DWORD)
+    kernel32.OpenProcess.restype = ctypes.wintypes.HANDLE
+    kernel32.GetProcessAffinityMask.argtypes = (
+        ctypes.wintypes.HANDLE,
+        ctypes.POINTER(ctypes.c_size_t),
+        ctypes.POINTER(ctypes.c_size_t),
+    )
+    kernel32.GetProcessAffinityMask.restype = ctypes.wintypes.BOOL
+    kernel32.SetProcessAffinityMask.argtypes = (ctypes.wintypes.HANDLE, ctypes.c_size_t)
+    kernel32.SetProcessAffinityMask.restype = ctypes.wintypes.BOOL
+    kernel32.CloseHandle.argtypes = (ctypes.wintypes.HANDLE,)
+    kernel32.CloseHandle.restype = ctypes.wintypes.BOOL
+    kernel32.CreateMutexW.argtypes = (ctypes.c_void_p, ctypes.wintypes.BOOL, ctypes.wintypes.LPCWSTR)
+    kernel32.CreateMutexW.restype = ctypes.wintypes.HANDLE
+    return kernel32
+
+
+def _process_handle(pid: int) -> int | None:
+    """Return a handle of a process that allows reading and setting its affinity, opening it on first use."""
+    with _CACHE_LOCK:
+        handle = _PROCESS_HANDLES.get(pid)
+        if handle is None:
+            handle = _kernel32().OpenProcess(_PROCESS_SET_INFORMATION | _PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+            if not handle:
+                return None
+            _PROCESS_HANDLES[pid] = handle
+    return handle
+
+
+def _close_process_handle(pid: int) -> None:
+    """Close the cached handle of a process, if there is one."""
+    with _CACHE_LOCK:
+        handle = _PROCESS_HANDLES.pop(pid, None)
+    if handle:
+        _kernel32().CloseHandle(handle)
+
+
+def _set_affinity_win32(pid, mask):
+    """Set the affinity mask of a process with SetProcessAffinityMask.
+
+    This skips psutil's conversion of the core list into a mask. Returns False when the affinity couldn't be set this
+    way (e.g. access denied, or a mask that doesn't fit in a single processor group), so the caller can fall back to
+    psutil.
+
+    """
+    if mask.bit_length() > _AFFINITY_MASK_BITS:
+        return False
+
+    handle = _process_handle(pid)
+    if handle is None:
+        return False
+    return bool(_kernel32().SetProcessAffinityMask(handle, mask))
+
+
+def _get_affinity_win32(pid: int) -> int | None:
+    """Return the affinity mask of a process from GetProcessAffinityMask.
+
+    This skips psutil's expansion of the mask into a list of cores. Returns None when the affinity couldn't be read this
+    way (e.g. access denied, or a process spanning several processor groups), so the caller can fall back to psutil.
+
+    """
+    handle = _process_handle(pid)
+    if handle is None:
+        return None
+    process_mask = ctypes.c_size_t()
+    system_mask = ctypes.c_size_t()
+    if not _kernel32().GetProcessAffinityMask(handle, ctypes.byref(process_mask), ctypes.byref(system_mask)):
+        return None
+    return process_mask.value or None
+
+
+def _read_affinity_mask(proc: psutil.Process) -> int:
+    """Return the bitmask of the cores a process is allowed to run on.
+
+    On Windows this is a direct GetProcessAffinityMask() call, on Linux a direct sched_getaffinity() call. psutil is
+    used elsewhere, and when the native call fails so that psutil raises the matching NoSuchProcess/AccessDenied error.
+
+    """
+    if _USE_WIN32_API:
+        mask = _get_affinity_win32(proc.pid)
+        if mask is not None:
+            return mask
+    if _USE_SCHED_AFFINITY:
+        try:
+            return cores_to_mask(os.sched_getaffinity(proc.pid))  # type: ignore[attr-defined]
+        except OSError:
+            pass
+    return cores_to_mask(proc.cpu_affinity())  # type: ignore[arg-type]
+
+
+def _write_affinity(proc: psutil.Process, target_cores: Collection[int], target_mask: int) -> None:
+    """Restrict a process to the target cores, using the cheapest API available on the platform."""
+    if _USE_WIN32_API and _set_affinity_win32(proc.pid, target_mask):
+        return
+    if _USE_SCHED_AFFINITY:
+        try:
+            os.sched_setaffinity(proc.pid, target_cores)  # type: ignore[attr-defined]
+            return
+        except OSError:
+            pass
+    proc.cpu_affinity(list(target_cores))
+
+
+def _apply_affinity(
+    proc: psutil.Process, target_cores: Collection[int], role: str, target_mask: int | None = None
+) -> None:
+    """Set the affinity of a process to the target cores unless it is already set.
+
+    The affinity applied to a process is remembered, so the kernel is only queried when a process is first seen, when
+    its target changes, and once the remembered affinity is older than _LAST_AFFINITY_TTL, so an affinity changed by
+    something else is still restored. Callers handling many processes pass the mask of the target cores, computed once.
+
+    """
+    if target_mask is None:
+        target_mask = cores_to_mask(target_cores)
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    now = time.monotonic()
+
+    with proc.oneshot():
+        key = (proc.pid, proc.create_time())
+        with _CACHE_LOCK:
+            applied = _LAST_AFFINITY.get(key)
+            already_set = applied is not None and applied[0] == target_mask and now - applied[1] < _LAST_AFFINITY_TTL
+            if already_set:
+                _LAST_AFFINITY.move_to_end(key)
+        if already_set:
+            if debug_enabled:
+                logger.debug("Affinity of %s process %s was already set to %s", role, proc.pid, target_cores)
+            return
+
+        current_mask = _read_affinity_mask(proc)
+        if debug_enabled:
+            current = mask_to_cores(current_mask)
+            logger.debug("Current affinity for %s process %s: %s", role, proc.pid, current)
+
+        if current_mask != target_mask:
+            if debug_enabled:
+                logger.debug("Updating %s %s from %s to %s", role, proc.pid, current, target_cores)
+            _write_affinity(proc, target_cores, target_mask)
+            if debug_enabled:
+                logger.debug("Affinity updated successfully for %s process %s", role, proc.pid)
+        elif debug_enabled:
+            logger.debug("No affinity update needed for %s process %s (already set to %s)", role, proc.pid, current)
+
+    with _CACHE_LOCK:
+        _LAST_AFFINITY[key] = (target_mask, now)
+        _LAST_AFFINITY.move_to_end(key)
+        while len(_LAST_AFFINITY) > _LAST_AFFINITY_MAX_SIZE:
+            _LAST_AFFINITY.popitem(last=False)
+
+
+def handle_main_process(proc: psutil.Process, target_cores: Collection[int], target_mask: int | None = None) -> None:
     """Handle affinity setting for the main process."""
-    logger.debug("Handling main process: %s (PID: %s)", proc.info["name"], proc.pid)
-    current = proc.cpu_affinity()
-    logger.debug("Current affinity for main process %s: %s", proc.pid, current)
-
-    if sorted(current) != target_cores:
-        logger.debug("Updating main %s from %s to %s", proc.pid, current, target_cores)
-        proc.cpu_affinity(target_cores)
-        logger.debug("Affinity updated successfully for main process %s", proc.pid)
-    else:
-        logger.debug("No affinity update needed for main process %s (already set to %s)", proc.pid, current)
+    _apply_affinity(proc, target_cores, "main", target_mask)
 
 
-def handle_worker_process(proc, target_cores):
+def handle_worker_process(proc: psutil.Process, target_cores: Collection[int], target_mask: int | None = None) -> None:
     """Handle affinity setting for a worker process."""
-    logger.debug("Handling worker process: %s (PID: %s)", proc.info["name"], proc.pid)
-    current = proc.cpu_affinity()
-    logger.debug("Current affinity for worker process %s: %s", proc.pid, current)
-
-    if sorted(current) != target_cores:
-        logger.debug("Updating worker %s from %s to %s", proc.pid, current, target_cores)
-        proc.cpu_affinity(target_cores)
-        logger.debug("Affinity updated successfully for worker process %s", proc.pid)
-    else:
-        logger.debug("No affinity update needed for worker process %s (already set to %s)", proc.pid, current)
+    _apply_affinity(proc, target_cores, "worker", target_mask)
 
 
-def validate_cores(cores):
+def validate_cores(cores: Sequence[int]) -> Sequence[int]:
     """Validate core numbers against system CPU count."""
-    cpu_count = psutil.cpu_count()
+    cpu_count = get_cpu_count()
 
-    if any(c >= cpu_count or c < 0 for c in cores):
+    # The cores can't simply be checked as a bitmask: a typo like '99999999999' would build a multi-gigabyte int
+    if cores and (min(cores) < 0 or max(cores) >= cpu_count):
         raise ValueError(f"Invalid core numbers. System has only {cpu_count} cores")
     return cores
+
+
+def _close_pidfds():
+    """Close all the pidfds opened for the tracked processes."""
+    while _PIDFDS:
+        os.close(_PIDFDS.popitem()[1])
+
+
+def _sync_pidfds():
+    """Open a pidfd for every newly tracked process and close the pidfds of the processes that are no longer tracked."""
+    global _EPOLL  # pylint: disable=global-statement
+
+    if _EPOLL is None:
+        _EPOLL = select.epoll()
+
+    tracked = {pid for pid, _ in _LAST_AFFINITY} - _EXITED_PIDS
+
+    for pid in _PIDFDS.keys() - tracked:
+        os.close(_PIDFDS.pop(pid))  # Closing the descriptor also removes it from the epoll set
+
+    for pid in tracked - _PIDFDS.keys():
+        try:
+            pidfd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            continue  # Already exited, the next refresh drops it
+        _EPOLL.register(pidfd, select.EPOLLIN)
+        _PIDFDS[pid] = pidfd
+
+
+def wait_for_process_exit(timeout: float) -> list[int]:
+    """Wait up to timeout seconds, returning early when one of the processes whose affinity was applied exits.
+
+    On Linux a pidfd is kept open for every tracked process and the wait blocks on an epoll set, so the monitoring loop
+    rescans as soon as a process exits instead of at the next interval. Where pidfd_open is not available (Windows, old
+    kernels) this falls back to sleeping for the whole timeout.
+
+    Returns the PIDs of the processes that exited.
+
+    """
+    global _PIDFDS_SUPPORTED  # pylint: disable=global-statement
+
+    if _PIDFDS_SUPPORTED:
+        try:
+            _sync_pidfds()
+        except OSError as e:
+            logger.debug("pidfd_open is not usable, falling back to sleeping: %s", e)
+            _PIDFDS_SUPPORTED = False
+            _close_pidfds()
+
+    if not _PIDFDS_SUPPORTED or not _PIDFDS:
+        time.sleep(timeout)
+        return []
+
+    exited = []
+    pids_by_fd = {pidfd: pid for pid, pidfd in _PIDFDS.items()}
+    for pidfd, _ in _EPOLL.poll(timeout):  # type: ignore[union-attr]
+        pid = pids_by_fd[pidfd]
+        logger.debug("Process %s exited, rescanning", pid)
+        os.close(_PIDFDS.pop(pid))
+        _PROC_CACHE.pop(pid, None)
+        for key in [key for key in _LAST_AFFINITY if key[0] == pid]:
+            del _LAST_AFFINITY[key]
+        _EXITED_PIDS.add(pid)
+        exited.append(pid)
+    return exited
@@ -4,8 +4,42 @@ This module contains fixtures that can be shared across multiple test files.
 
 """
 
+import contextlib
+
+import psutil
 import pytest
 
+from bas_set_cpu_affinity.cli import calculate_default_main_cores
+from bas_set_cpu_affinity.core import clear_caches as clear_process_caches
+from bas_set_cpu_affinity.core import get_cpu_count
+
+
+@pytest.fixture(autouse=True)
+def disable_native_apis(monkeypatch):
+    """Route process queries and affinity changes through the mocked psutil functions instead of the OS APIs."""
+    monkeypatch.setattr("bas_set_cpu_affinity.core._USE_PROCFS", False)
+    monkeypatch.setattr("bas_set_cpu_affinity.core._USE_NT_PROCESS_LIST", False)
+    monkeypatch.setattr("bas_set_cpu_affinity.core._USE_WIN32_API", False)
+    monkeypatch.setattr("bas_set_cpu_affinity.core._USE_SCHED_AFFINITY", False)
+
+
+@pytest.fixture(autouse=True)
+def pin_cpu_count(monkeypatch, mock_cpu_count):  # pylint:disable=redefined-outer-name
+    """Report the same number of CPUs on every host, so default and validated cores don't depend on the machine."""
+    monkeypatch.setattr(psutil, "cpu_count", mock_cpu_count)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Clear the module-level caches so that tests don't leak processes or CPU counts into each other."""
+    clear_process_caches()
+    get_cpu_count.cache_clear()
+    calculate_default_main_cores.cache_clear()
+    yield
+    clear_process_caches()
+    get_cpu_count.cache_clear()
+    calculate_default_main_cores.cache_clear()
+
 
 @pytest.fixture
 def mock_process():
@@ -17,6 +51,8 @@ def mock_process():
     """
 
     class MockProcess:
+        __slots__ = ("info", "_affinity", "affinity_calls", "pid")
+
         def __init__(self):
             self.info = {"name": "test_process.exe", "pid": 1000}
             self._affinity = [0, 1]
@@ -29,6 +65,12 @@ def mock_process():
                 self._affinity = new_affinity
             return self._affinity
 
+        def create_time(self):
+            return 1700000000.0
+
+        def oneshot(self):
+            return contextlib.nullcontext()
+
     return MockProcess()
 
 
@@ -42,6 +84,8 @@ def mock_process_iter():
     """
 
     class MockProcess:
+        __slots__ = ("info", "_affinity", "affinity_calls")
+
         def __init__(self, name, pid):
             self.info = {"name": name, "pid": pid}
             self._affinity = [0, 1]
@@ -53,6 +97,9 @@ def mock_process_iter():
                 self._affinity = new_affinity
             return self._affinity
 
+        def oneshot(self):
+            return contextlib.nullcontext()
+
     # Create some default test processes
     processes = [
         MockProcess("System", 1),
@@ -68,51 +115,71 @@ def mock_process_iter():
 
 
 @pytest.fixture
-def mock_cpu_count():
-    """Create a mock for psutil.cpu_count.
+def mock_process_table(monkeypatch):
+    """Create a fake table of running processes, served through psutil.pids and psutil.Process.
 
     Returns:
-        function: A mock cpu_count function that returns a configurable number of CPUs.
+        MockProcessTable: The running processes keyed by PID. Starting a process under a PID that is in use replaces it,
+        deleting an entry ends it, and the PIDs passed to psutil.Process are recorded in its ``resolved`` list.
 
     """
 
-    def mock_cpu_count():  # pylint:disable=redefined-outer-name
-        return 8
+    class MockProcess:
+        __slots__ = ("pid", "process_name", "_affinity")
 
-    return mock_cpu_count
+        def __init__(self, pid, name, affinity):
+            self.pid = pid
+            self.process_name = name  # Set to a new name to simulate a process calling exec
+            self._affinity = affinity
+
+        def name(self):
+            return self.process_name
+
+        def cpu_affinity(self, new_affinity=None):
+            if new_affinity is not None:
+                self._affinity = new_affinity
+            return self._affinity
+
+        def create_time(self):
+            return 1700000000.0
+
+        def oneshot(self):
+            return contextlib.nullcontext()
+
+    class MockProcessTable(dict):
+        def __init__(self):
+            super().__init__()
+            self.resolved = []
+
+        def start(self, pid, name, affinity=(0, 1)):
+            self[pid] = MockProcess(pid, name, list(affinity))
+            return self[pid]
+
+        def names(self):
+            return {pid: proc.process_name for pid, proc in self.items()}
+
+        def process(self, pid):
+            self.resolved.append(pid)
+            if pid not in self:
+                raise psutil.NoSuchProcess(pid)
+            return self[pid]
+
+    table = MockProcessTable()
+    monkeypatch.setattr(psutil, "pids", lambda: list(table))
+    monkeypatch.setattr(psutil, "Process", table.process)
+    return table
 
 
 @pytest.fixture
-def mock_win32_api():
-    """Create mocks for Windows API functions.
+def mock_cpu_count():
+    """Create a mock for psutil.cpu_count.
 
     Returns:
-        dict: A dictionary containing mock functions for various Windows API functions.
+        function: A mock cpu_count function that returns a configurable number of CPUs.
 
     """
-    create_mutex_called = False
-    get_last_error_called = False
-    message_box_called = False
-
-    def create_mutex(*args, **kwargs):  # pylint:disable=unused-argument
-        nonlocal create_mutex_called
-        create_mutex_called = True
-        return "mock_mutex"
-
-    def get_last_error():
-        nonlocal get_last_error_called
-        get_last_error_called = True
-        return 0  # No error by default
-
-    def message_box(*args, **kwargs):  # pylint:disable=unused-argument
-        nonlocal message_box_called
-        message_box_called = True
-
-    return {
-        "CreateMutex": create_mutex,
-        "GetLastError": get_last_error,
-        "MessageBox": message_box,
-        "create_mutex_called": lambda: create_mutex_called,
-        "get_last_error_called": lambda: get_last_error_called,
-        "message_box_called": lambda: message_box_called,
-    }
+
+    def mock_cpu_count():  # pylint:disable=redefined-outer-name
+        return 8
+
+    return mock_cpu_count
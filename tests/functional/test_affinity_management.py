@@ -4,13 +4,14 @@ This module contains tests that verify the application works correctly as a whol
 
 """
 
+import contextlib
 import sys
 
 import psutil
 import pytest
 
 from bas_set_cpu_affinity.cli import main
-from bas_set_cpu_affinity.core import set_affinities
+from bas_set_cpu_affinity.core import cores_to_mask, set_affinities
 
 
 class TestCLIEntryPoint:
@@ -49,61 +50,72 @@ class TestProcessAffinitySetting:
     def test_process_affinity_setting(self, monkeypatch):
         """Test that process affinities are correctly set."""
         # Setup
-        main_names = ["main.exe"]
-        worker_names = ["worker.exe"]
+        main_names = frozenset({"main.exe"})
+        worker_names = frozenset({"worker.exe"})
         main_cores = [0, 1]
         worker_cores = [2, 3]
 
         # Create mock processes
         class MockProcess:
+            __slots__ = ("info", "pid", "_affinity", "affinity_calls")
+
             def __init__(self, name, pid, initial_affinity):
                 self.info = {"name": name, "pid": pid}
+                self.pid = pid
                 self._affinity = initial_affinity
                 self.affinity_calls = []
 
+            def name(self):
+                return self.info["name"]
+
             def cpu_affinity(self, new_affinity=None):
                 if new_affinity is not None:
                     self._affinity = new_affinity
                     self.affinity_calls.append(new_affinity)
                 return self._affinity
 
+            def oneshot(self):
+                return contextlib.nullcontext()
+
         # Create mock processes
         main_process = MockProcess("main.exe", 1000, [0, 2])
         worker_process = MockProcess("worker.exe", 1001, [1, 3])
 
-        # Track process_iter calls
-        process_iter_called = False
+        processes = {main_process.pid: main_process, worker_process.pid: worker_process}
+
+        # Track pids calls
+        pids_called = False
 
-        def mock_process_iter(*args, **kwargs):
-            nonlocal process_iter_called
-            process_iter_called = True
-            print(f"process_iter called with args: {args}, kwargs: {kwargs}")
-            print(f"Returning processes: {[p.info['name'] for p in [main_process, worker_process]]}")
-            return [main_process, worker_process]
+        def mock_pids():
+            nonlocal pids_called
+            pids_called = True
+            print(f"Returning processes: {[p.info['name'] for p in processes.values()]}")
+            return list(processes)
 
         # Track handle_main_process and handle_worker_process calls
         handle_main_called = False
         handle_worker_called = False
 
-        def mock_handle_main_process(proc, cores):
+        def mock_handle_main_process(proc, cores, mask):
             nonlocal handle_main_called
             handle_main_called = True
             print(f"handle_main_process called with proc: {proc.info['name']}, cores: {cores}")
             # Call the real implementation
             current = proc.cpu_affinity()
-            if sorted(current) != cores:
+            if cores_to_mask(current) != mask:
                 proc.cpu_affinity(cores)
 
-        def mock_handle_worker_process(proc, cores):
+        def mock_handle_worker_process(proc, cores, mask):
             nonlocal handle_worker_called
             handle_worker_called = True
             print(f"handle_worker_process called with proc: {proc.info['name']}, cores: {cores}")
             # Call the real implementation
             current = proc.cpu_affinity()
-            if sorted(current) != cores:
+            if cores_to_mask(current) != mask:
                 proc.cpu_affinity(cores)
 
-        monkeypatch.setattr(psutil, "process_iter", mock_process_iter)
+        monkeypatch.setattr(psutil, "pids", mock_pids)
+        monkeypatch.setattr(psutil, "Process", lambda pid: processes[pid])
         monkeypatch.setattr("bas_set_cpu_affinity.core.handle_main_process", mock_handle_main_process)
         monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_worker_process)
 
@@ -111,12 +123,12 @@ class TestProcessAffinitySetting:
         main_found, worker_found = set_affinities(main_names, worker_names, main_cores, worker_cores)
 
         # Verify
-        print(f"process_iter_called: {process_iter_called}")
+        print(f"pids_called: {pids_called}")
         print(f"handle_main_called: {handle_main_called}")
         print(f"handle_worker_called: {handle_worker_called}")
         print(f"main_found: {main_found}, worker_found: {worker_found}")
 
-        assert process_iter_called
+        assert pids_called
         assert handle_main_called
         assert handle_worker_called
         assert main_found is True
@@ -142,14 +154,15 @@ class TestContinuousMonitoring:
         runner = CliRunner()
 
         # Create counters to track calls
-        move_processes_call_count = 0
+        reconcile_call_count = 0
         set_affinities_call_count = 0
         sleep_call_count = 0
 
         # Create mock functions with side effects
-        def mock_move_processes_from_main_cores(*args, **kwargs):  # pylint:disable=unused-argument
-            nonlocal move_processes_call_count
-            move_processes_call_count += 1
+        def mock_reconcile(*args, **kwargs):  # pylint:disable=unused-argument
+            nonlocal reconcile_call_count
+            reconcile_call_count += 1
+            return (True, True)  # The first check at startup: both main and worker processes found
 
         def mock_set_affinities(*args, **kwargs):  # pylint:disable=unused-argument
             nonlocal set_affinities_call_count
@@ -172,9 +185,7 @@ class TestContinuousMonitoring:
             sleep_call_count += 1
 
         # Apply the monkeypatches
-        monkeypatch.setattr(
-            "bas_set_cpu_affinity.cli.move_processes_from_main_cores", mock_move_processes_from_main_cores
-        )
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.reconcile", mock_reconcile)
         monkeypatch.setattr("bas_set_cpu_affinity.cli.set_affinities", mock_set_affinities)
         monkeypatch.setattr(time, "sleep", mock_sleep)
 
@@ -184,10 +195,10 @@ class TestContinuousMonitoring:
         # Verify
         assert result.exit_code == 0
         assert set_affinities_call_count == 5
-        assert sleep_call_count == 4  # Should sleep after each check except the last one
+        assert sleep_call_count == 5  # Should sleep after each check except the last one
 
-        # Should have called move_processes_from_main_cores once at startup
-        assert move_processes_call_count == 1
+        # Should have called reconcile once at startup, as the first check
+        assert reconcile_call_count == 1
 
 
 @pytest.mark.skipif(sys.platform != "win32", reason="Windows-specific test")
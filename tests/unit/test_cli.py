@@ -35,7 +35,7 @@ class TestCalculateDefaultMainCores:
         result = calculate_default_main_cores()
 
         # Verify
-        assert result == [0]
+        assert result == (0,)
 
     def test_medium_cpu_count(self, monkeypatch):
         """Test with a medium CPU count (5-8 cores)."""
@@ -50,7 +50,7 @@ class TestCalculateDefaultMainCores:
         result = calculate_default_main_cores()
 
         # Verify
-        assert result == [0, 1]
+        assert result == (0, 1)
 
     def test_large_cpu_count(self, monkeypatch):
         """Test with a large CPU count (more than 8 cores)."""
@@ -65,7 +65,7 @@ class TestCalculateDefaultMainCores:
         result = calculate_default_main_cores()
 
         # Verify
-        assert result == [0, 1, 2, 3]  # 25% of 16 = 4 cores
+        assert result == (0, 1, 2, 3)  # 25% of 16 = 4 cores
 
     def test_very_large_cpu_count(self, monkeypatch):
         """Test with a very large CPU count (should cap at 4 cores)."""
@@ -80,7 +80,7 @@ class TestCalculateDefaultMainCores:
         result = calculate_default_main_cores()
 
         # Verify
-        assert result == [0, 1, 2, 3]  # Should cap at 4 cores
+        assert result == (0, 1, 2, 3)  # Should cap at 4 cores
 
 
 class TestValidateCoresCallback:
@@ -159,15 +159,15 @@ class TestManageAffinity:
         runner = CliRunner()
 
         # Create counters to track calls
-        move_processes_call_count = 0
+        reconcile_call_count = 0
         set_affinities_call_count = 0
         sleep_call_count = 0
 
         # Create mock functions with side effects
-        def mock_move_processes_from_main_cores(*args, **kwargs):  # pylint:disable=unused-argument
-            nonlocal move_processes_call_count
-            move_processes_call_count += 1
-            return args[1]  # Return worker_cores for later assertions
+        def mock_reconcile(*args, **kwargs):  # pylint:disable=unused-argument
+            nonlocal reconcile_call_count
+            reconcile_call_count += 1
+            return (True, True)
 
         def mock_set_affinities(*args, **kwargs):  # pylint:disable=unused-argument
             nonlocal set_affinities_call_count
@@ -183,9 +183,7 @@ class TestManageAffinity:
             sleep_call_count += 1
 
         # Apply the monkey patches
-        monkeypatch.setattr(
-            "bas_set_cpu_affinity.cli.move_processes_from_main_cores", mock_move_processes_from_main_cores
-        )
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.reconcile", mock_reconcile)
         monkeypatch.setattr("bas_set_cpu_affinity.cli.set_affinities", mock_set_affinities)
         monkeypatch.setattr(time, "sleep", mock_sleep)
 
@@ -194,7 +192,7 @@ class TestManageAffinity:
 
         # Verify
         assert result.exit_code == 0
-        assert move_processes_call_count == 1
+        assert reconcile_call_count == 1
         assert set_affinities_call_count > 0
         assert sleep_call_count > 0
 
@@ -204,24 +202,20 @@ class TestManageAffinity:
         runner = CliRunner()
 
         # Create variables to track calls and arguments
-        move_processes_args = None
-        set_affinities_args = ([], [], [])  # Initialize with empty lists
+        reconcile_args = None
+        set_affinities_args = (frozenset(), frozenset(), ())  # Initialize with empty collections
         sleep_seconds = None
 
         # Create mock functions with side effects
-        def mock_move_processes_from_main_cores(*args, **kwargs):  # pylint:disable=unused-argument
-            nonlocal move_processes_args
-            move_processes_args = args
-            return args[1]  # Return worker_cores for later assertions
+        def mock_reconcile(*args, **kwargs):  # pylint:disable=unused-argument
+            nonlocal reconcile_args
+            reconcile_args = args
+            return (True, True)
 
         def mock_set_affinities(*args, **kwargs):  # pylint:disable=unused-argument
             nonlocal set_affinities_args
-            # Store args as a tuple of lists to ensure it's subscriptable
-            set_affinities_args = (
-                args[0] if isinstance(args[0], list) else [args[0]],
-                args[1] if isinstance(args[1], list) else [args[1]],
-                args[2] if isinstance(args[2], list) else [args[2]],
-            )
+            # Store args as a tuple to ensure it's subscriptable
+            set_affinities_args = (args[0], args[1], args[2])
 
             if not hasattr(mock_set_affinities, "called"):
                 mock_set_affinities.called = True
@@ -234,11 +228,10 @@ class TestManageAffinity:
             sleep_seconds = seconds
 
         # Apply the monkeypatches
-        monkeypatch.setattr(
-            "bas_set_cpu_affinity.cli.move_processes_from_main_cores", mock_move_processes_from_main_cores
-        )
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.reconcile", mock_reconcile)
         monkeypatch.setattr("bas_set_cpu_affinity.cli.set_affinities", mock_set_affinities)
         monkeypatch.setattr(time, "sleep", mock_sleep)
+        monkeypatch.setattr(time, "monotonic", lambda: 100.0)  # Checks take no time
 
         # Execute
         result = runner.invoke(
@@ -257,13 +250,182 @@ class TestManageAffinity:
 
         # Verify
         assert result.exit_code == 0
-        assert move_processes_args is not None
+        assert reconcile_args is not None
         assert set_affinities_args is not None
-        assert set_affinities_args[0] == ["custom.exe"]  # main_names
-        assert set_affinities_args[1] == ["worker1.exe", "worker2.exe"]  # worker_names
-        assert set_affinities_args[2] == [0, 1]  # main_cores
+        assert set_affinities_args[0] == frozenset({"custom.exe"})  # main_names
+        assert set_affinities_args[1] == frozenset({"worker1.exe", "worker2.exe"})  # worker_names
+        assert set_affinities_args[2] == (0, 1)  # main_cores
         assert sleep_seconds == 5.0
 
+    def test_sleep_accounts_for_check_duration(self, monkeypatch):
+        """Test that the time spent checking processes is subtracted from the polling interval."""
+        # Setup
+        runner = CliRunner()
+        sleep_seconds = []
+        clock = iter([100.0, 102.0])  # The check takes 2 seconds
+
+        def mock_set_affinities(*args, **kwargs):  # pylint:disable=unused-argument
+            if sleep_seconds:
+                raise KeyboardInterrupt  # The second call raises KeyboardInterrupt to exit loop
+            return (True, True)
+
+        monkeypatch.setattr(psutil, "cpu_count", lambda: 4)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.reconcile", lambda *args: (True, True))
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.set_affinities", mock_set_affinities)
+        monkeypatch.setattr(time, "sleep", sleep_seconds.append)
+        monkeypatch.setattr(time, "monotonic", lambda: next(clock, 102.0))
+
+        # Execute
+        result = runner.invoke(manage_affinity, ["0-1", "--interval", "5"])
+
+        # Verify
+        assert result.exit_code == 0
+        assert sleep_seconds == [3.0]
+
+    def test_exit_bursts_are_rate_limited(self, monkeypatch):
+        """Test that processes exiting in quick succession don't start a check each."""
+        # Setup
+        runner = CliRunner()
+        now = 100.0
+        set_affinities_call_count = 0
+
+        def mock_set_affinities(*args, **kwargs):  # pylint:disable=unused-argument
+            nonlocal set_affinities_call_count
+            set_affinities_call_count += 1
+            return (True, True)
+
+        def mock_wait_for_process_exit(timeout):
+            nonlocal now
+            if now >= 110.0:
+                raise KeyboardInterrupt  # Exit the loop after one 10 seconds interval
+            now += min(timeout, 0.1)
+            return [2000]  # A managed process exits every 0.1 seconds
+
+        monkeypatch.setattr(psutil, "cpu_count", lambda: 4)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.reconcile", lambda *args: (True, True))
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.set_affinities", mock_set_affinities)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.wait_for_process_exit", mock_wait_for_process_exit)
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+
+        # Execute
+        result = runner.invoke(manage_affinity, ["0-1", "--interval", "10"])
+
+        # Verify
+        assert result.exit_code == 0
+        assert set_affinities_call_count <= 11  # At most one check per second instead of one per exit
+
+    def test_first_check_is_reconcile(self, monkeypatch):
+        """Test that the startup pass is the first check, so the processes aren't listed again before the first wait."""
+        # Setup
+        runner = CliRunner()
+        calls = []
+
+        def mock_reconcile(*args, **kwargs):  # pylint:disable=unused-argument
+            calls.append("reconcile")
+            return (True, True)
+
+        def mock_set_affinities(*args, **kwargs):  # pylint:disable=unused-argument
+            calls.append("set_affinities")
+            raise KeyboardInterrupt  # Exit the loop
+
+        monkeypatch.setattr(psutil, "cpu_count", lambda: 4)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.reconcile", mock_reconcile)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.set_affinities", mock_set_affinities)
+        monkeypatch.setattr(time, "sleep", lambda seconds: calls.append("sleep"))
+
+        # Execute
+        result = runner.invoke(manage_affinity, ["0-1"])
+
+        # Verify
+        assert result.exit_code == 0
+        assert calls == ["reconcile", "sleep", "set_affinities"]
+
+    def test_failed_reconcile_is_retried(self, monkeypatch):
+        """Test that the startup pass is repeated on the next check when it fails."""
+        # Setup
+        runner = CliRunner()
+        calls = []
+
+        def mock_reconcile(*args, **kwargs):  # pylint:disable=unused-argument
+            calls.append("reconcile")
+            if calls.count("reconcile") == 1:
+                raise OSError("Test error")
+            return (True, True)
+
+        def mock_set_affinities(*args, **kwargs):  # pylint:disable=unused-argument
+            calls.append("set_affinities")
+            raise KeyboardInterrupt  # Exit the loop
+
+        monkeypatch.setattr(psutil, "cpu_count", lambda: 4)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.reconcile", mock_reconcile)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.set_affinities", mock_set_affinities)
+        monkeypatch.setattr(time, "sleep", lambda seconds: calls.append("sleep"))
+
+        # Execute
+        result = runner.invoke(manage_affinity, ["0-1"])
+
+        # Verify
+        assert result.exit_code == 0
+        assert calls == ["reconcile", "sleep", "reconcile", "sleep", "set_affinities"]
+
+    def test_interrupted_while_waiting(self, monkeypatch):
+        """Test that interrupting the wait between checks exits cleanly."""
+        # Setup
+        runner = CliRunner()
+        check_count = 0
+
+        def mock_check(*args, **kwargs):  # pylint:disable=unused-argument
+            nonlocal check_count
+            check_count += 1
+            return (True, True)
+
+        def mock_sleep(seconds):  # pylint:disable=unused-argument
+            raise KeyboardInterrupt  # Ctrl+C is pressed while waiting for the next check
+
+        monkeypatch.setattr(psutil, "cpu_count", lambda: 4)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.reconcile", mock_check)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.set_affinities", mock_check)
+        monkeypatch.setattr(time, "sleep", mock_sleep)
+
+        # Execute
+        result = runner.invoke(manage_affinity, ["0-1"])
+
+        # Verify
+        assert result.exit_code == 0
+        assert check_count == 1
+
+    def test_soft_affinity(self, monkeypatch):
+        """Test that main processes may use all cores while other processes are still moved off the main cores."""
+        # Setup
+        runner = CliRunner()
+        reconcile_args = ()
+        set_affinities_args = ()
+
+        def mock_reconcile(*args, **kwargs):  # pylint:disable=unused-argument
+            nonlocal reconcile_args
+            reconcile_args = args
+            return (True, True)
+
+        def mock_set_affinities(*args, **kwargs):  # pylint:disable=unused-argument
+            nonlocal set_affinities_args
+            if set_affinities_args:
+                raise KeyboardInterrupt  # The second call raises KeyboardInterrupt to exit loop
+            set_affinities_args = args
+            return (True, True)
+
+        monkeypatch.setattr(psutil, "cpu_count", lambda: 4)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.reconcile", mock_reconcile)
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.set_affinities", mock_set_affinities)
+        monkeypatch.setattr(time, "sleep", lambda seconds: None)
+
+        # Execute
+        result = runner.invoke(manage_affinity, ["0-1", "--soft-affinity"])
+
+        # Verify
+        assert result.exit_code == 0
+        assert reconcile_args[2:] == ((0, 1, 2, 3), (2, 3), (0, 1))  # Other processes are moved off the main cores
+        assert set_affinities_args[2:] == ((0, 1, 2, 3), (2, 3))  # Main processes may run on all cores
+
     def test_no_worker_cores(self, monkeypatch):
         """Test when no cores are available for worker processes."""
         # Setup
@@ -291,8 +453,8 @@ class TestManageAffinity:
         sleep_call_count = 0
 
         # Create mock functions with side effects
-        def mock_move_processes_from_main_cores(*args, **kwargs):  # pylint:disable=unused-argument
-            return args[1]  # Return worker_cores for later assertions
+        def mock_reconcile(*args, **kwargs):  # pylint:disable=unused-argument
+            return (True, True)
 
         def mock_set_affinities(*args, **kwargs):  # pylint:disable=unused-argument
             nonlocal set_affinities_call_count
@@ -307,9 +469,7 @@ class TestManageAffinity:
             sleep_call_count += 1
 
         # Apply the monkey patches
-        monkeypatch.setattr(
-            "bas_set_cpu_affinity.cli.move_processes_from_main_cores", mock_move_processes_from_main_cores
-        )
+        monkeypatch.setattr("bas_set_cpu_affinity.cli.reconcile", mock_reconcile)
         monkeypatch.setattr("bas_set_cpu_affinity.cli.set_affinities", mock_set_affinities)
         monkeypatch.setattr(time, "sleep", mock_sleep)
 
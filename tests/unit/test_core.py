@@ -4,23 +4,30 @@ This module contains tests for the core functionality of the CPU affinity manage
 
 """
 
+import contextlib
+import ctypes
+import os
+import struct
+import subprocess
 import sys
+import time
 
 import psutil
 import pytest
-import win32api
-import win32event
-import win32ui
-import winerror
 
 from bas_set_cpu_affinity.core import (
     check_single_instance,
+    cores_to_mask,
     handle_main_process,
     handle_worker_process,
+    mask_to_cores,
     move_processes_from_main_cores,
     parse_core_string,
+    parse_names,
+    reconcile,
     set_affinities,
     validate_cores,
+    wait_for_process_exit,
 )
 
 
@@ -30,12 +37,12 @@ class TestParseCorString:
     def test_valid_core_string(self):
         """Test parsing a valid core string."""
         result = parse_core_string("0-2-4")
-        assert result == [0, 2, 4]
+        assert result == (0, 2, 4)
 
     def test_duplicate_cores(self):
         """Test parsing a core string with duplicate cores."""
         result = parse_core_string("0-0-1-2-1")
-        assert result == [0, 1, 2]  # Should deduplicate and sort
+        assert result == (0, 1, 2)  # Should deduplicate and sort
 
     def test_empty_string(self):
         """Test parsing an empty string."""
@@ -48,6 +55,46 @@ class TestParseCorString:
             parse_core_string("a-b-c")
 
 
+class TestParseNames:
+    """Tests for the parse_names function."""
+
+    def test_comma_separated_string(self):
+        """Test parsing a comma-separated string of process names."""
+        assert parse_names("Main.exe, worker.EXE") == frozenset({"main.exe", "worker.exe"})
+
+    def test_separate_names(self):
+        """Test parsing separate process names."""
+        assert parse_names(["Main.exe", "main.exe", " Worker.exe"]) == frozenset({"main.exe", "worker.exe"})
+
+
+class TestCoresToMask:
+    """Tests for the cores_to_mask function."""
+
+    def test_cores_to_mask(self):
+        """Test converting core numbers into a bitmask."""
+        assert cores_to_mask([0, 2, 4]) == 0b10101
+
+    def test_order_and_duplicates(self):
+        """Test that the order and duplicates of the core numbers don't change the bitmask."""
+        assert cores_to_mask([4, 0, 2, 0]) == cores_to_mask([0, 2, 4])
+
+    def test_no_cores(self):
+        """Test converting an empty collection of cores."""
+        assert cores_to_mask([]) == 0
+
+
+class TestMaskToCores:
+    """Tests for the mask_to_cores function."""
+
+    def test_mask_to_cores(self):
+        """Test converting a bitmask into core numbers."""
+        assert mask_to_cores(0b10101) == (0, 2, 4)
+
+    def test_round_trip(self):
+        """Test that converting cores into a bitmask and back returns the sorted, unique cores."""
+        assert mask_to_cores(cores_to_mask([7, 3, 3, 0])) == (0, 3, 7)
+
+
 class TestValidateCores:
     """Tests for the validate_cores function."""
 
@@ -95,6 +142,20 @@ class TestValidateCores:
         with pytest.raises(ValueError):
             validate_cores(cores)
 
+    def test_huge_core_number(self, monkeypatch):
+        """Test validating a core number far beyond the system CPU count."""
+
+        # Setup
+        def mock_cpu_count():
+            return 8
+
+        monkeypatch.setattr(psutil, "cpu_count", mock_cpu_count)
+
+        # Execute and verify
+        cores = parse_core_string("0-99999999999")
+        with pytest.raises(ValueError, match="System has only 8 cores"):
+            validate_cores(cores)
+
 
 class TestHandleProcesses:
     """Tests for handle_main_process and handle_worker_process functions."""
@@ -162,6 +223,177 @@ class TestHandleProcesses:
         assert len(mock_process.affinity_calls) == 1
         assert mock_process.affinity_calls[0] is None  # Only called to get current affinity
 
+    def test_handle_worker_process_unordered_affinity(self, mock_process):
+        """Test that the affinity isn't updated when the kernel returns the target cores in a different order."""
+
+        # Setup
+        mock_process._affinity = [3, 2]  # pylint:disable=protected-access
+        target_cores = [2, 3]
+
+        # Execute
+        handle_worker_process(mock_process, target_cores)
+
+        # Verify
+        assert mock_process.affinity_calls == [None]  # Only called to get current affinity
+
+    def test_handle_process_win32_api(self, mock_process, monkeypatch):
+        """Test that the affinity is set through the Windows API when it is available."""
+
+        # Setup
+        set_calls = []
+
+        def mock_set_affinity_win32(pid, mask):
+            set_calls.append((pid, mask))
+            return True
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_WIN32_API", True)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._get_affinity_win32", lambda pid: None)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._set_affinity_win32", mock_set_affinity_win32)
+        mock_process._affinity = [0, 1]  # pylint:disable=protected-access
+
+        # Execute
+        handle_worker_process(mock_process, [2, 3])
+
+        # Verify
+        assert set_calls == [(1000, 0b1100)]
+        assert mock_process.affinity_calls == [None]  # Only called to get current affinity
+
+    def test_handle_process_win32_api_fallback(self, mock_process, monkeypatch):
+        """Test that psutil is used when the affinity can't be set through the Windows API."""
+
+        # Setup
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_WIN32_API", True)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._get_affinity_win32", lambda pid: None)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._set_affinity_win32", lambda pid, mask: False)
+        mock_process._affinity = [0, 1]  # pylint:disable=protected-access
+
+        # Execute
+        handle_worker_process(mock_process, [2, 3])
+
+        # Verify
+        assert mock_process.affinity_calls == [None, [2, 3]]
+
+    def test_handle_process_win32_api_read(self, mock_process, monkeypatch):
+        """Test that the current affinity mask is read through the Windows API when it is available."""
+
+        # Setup
+        set_calls = []
+
+        def mock_set_affinity_win32(pid, mask):
+            set_calls.append((pid, mask))
+            return True
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_WIN32_API", True)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._get_affinity_win32", lambda pid: 0b0011)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._set_affinity_win32", mock_set_affinity_win32)
+
+        # Execute
+        handle_worker_process(mock_process, [2, 3])
+
+        # Verify
+        assert set_calls == [(1000, 0b1100)]
+        assert not mock_process.affinity_calls  # psutil is not used at all
+
+    def test_handle_process_sched_affinity(self, mock_process, monkeypatch):
+        """Test that the affinity is read and set with the sched_*affinity syscalls when they are available."""
+
+        # Setup
+        set_calls = []
+
+        def mock_sched_setaffinity(pid, cores):
+            set_calls.append((pid, list(cores)))
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_SCHED_AFFINITY", True)
+        monkeypatch.setattr(os, "sched_getaffinity", lambda pid: {0, 1}, raising=False)
+        monkeypatch.setattr(os, "sched_setaffinity", mock_sched_setaffinity, raising=False)
+
+        # Execute
+        handle_worker_process(mock_process, [2, 3])
+
+        # Verify
+        assert set_calls == [(1000, [2, 3])]
+        assert not mock_process.affinity_calls  # psutil is not used at all
+
+    def test_handle_process_already_applied(self, mock_process):
+        """Test that the affinity is not read again once it has been applied to the same process."""
+
+        # Setup
+        mock_process._affinity = [0, 1]  # pylint:disable=protected-access
+        target_cores = [2, 3]
+        handle_worker_process(mock_process, target_cores)
+        mock_process.affinity_calls.clear()
+
+        # Execute
+        handle_worker_process(mock_process, target_cores)
+
+        # Verify
+        assert not mock_process.affinity_calls  # The applied affinity is remembered, no kernel query needed
+
+    def test_affinity_changed_by_another_process(self, mock_process_table, monkeypatch):
+        """Test that an affinity changed outside the tool is restored once the remembered affinity has expired."""
+        # Setup
+        now = 100.0
+        worker = mock_process_table.start(1001, "worker.exe", [0, 1, 2, 3])
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+        set_affinities(frozenset(), frozenset({"worker.exe"}), [0, 1], [2, 3])
+        worker.cpu_affinity([0, 1, 2, 3])  # Something else widens the affinity again
+
+        # Execute
+        now += 10.0
+        set_affinities(frozenset(), frozenset({"worker.exe"}), [0, 1], [2, 3])
+        affinity_before_expiry = worker.cpu_affinity()
+        now += 30.0
+        set_affinities(frozenset(), frozenset({"worker.exe"}), [0, 1], [2, 3])
+
+        # Verify
+        assert affinity_before_expiry == [0, 1, 2, 3]  # The affinity isn't read again on every poll
+        assert worker.cpu_affinity() == [2, 3]
+
+    def test_applied_affinities_are_bounded(self, mock_process, monkeypatch):
+        """Test that the oldest remembered affinities are evicted once the memo is full."""
+
+        # Setup
+        monkeypatch.setattr("bas_set_cpu_affinity.core._LAST_AFFINITY_MAX_SIZE", 2)
+        target_cores = [2, 3]
+
+        for pid in (1000, 1001, 1002):
+            mock_process.pid = pid
+            handle_worker_process(mock_process, target_cores)
+        mock_process.affinity_calls.clear()
+
+        # Execute
+        handle_worker_process(mock_process, target_cores)
+        recent_calls = list(mock_process.affinity_calls)
+        mock_process.pid = 1000
+        handle_worker_process(mock_process, target_cores)
+
+        # Verify
+        assert not recent_calls  # The most recent process is still remembered
+        assert mock_process.affinity_calls == [None]  # The oldest one was evicted, its affinity is read again
+
+    def test_recently_seen_affinities_are_kept(self, mock_process, monkeypatch):
+        """Test that the least recently seen affinity is evicted rather than the oldest one."""
+
+        # Setup
+        monkeypatch.setattr("bas_set_cpu_affinity.core._LAST_AFFINITY_MAX_SIZE", 2)
+        target_cores = [2, 3]
+
+        for pid in (1000, 1001, 1000, 1002):  # The long-lived process 1000 is seen again before 1002 starts
+            mock_process.pid = pid
+            handle_worker_process(mock_process, target_cores)
+        mock_process.affinity_calls.clear()
+
+        # Execute
+        mock_process.pid = 1000
+        handle_worker_process(mock_process, target_cores)
+        long_lived_calls = list(mock_process.affinity_calls)
+        mock_process.pid = 1001
+        handle_worker_process(mock_process, target_cores)
+
+        # Verify
+        assert not long_lived_calls  # Still remembered
+        assert mock_process.affinity_calls == [None]  # The least recently seen process was evicted
+
 
 class TestMoveProcesses:
     """Tests for the move_processes_from_main_cores function."""
@@ -187,13 +419,17 @@ class TestMoveProcesses:
                     self._affinity = new_affinity
                 return self._affinity
 
+            def oneshot(self):
+                return contextlib.nullcontext()
+
         # Create mock processes
         main_process = MockProcess("main.exe", 1000, [0, 1])
         other_process = MockProcess("other.exe", 1001, [0, 1])
+        spanning_process = MockProcess("spanning.exe", 1002, [1, 2])
         system_process = MockProcess("System", 4)
 
         def mock_process_iter(*args, **kwargs):  # pylint:disable=unused-argument
-            return [main_process, other_process, system_process]
+            return [main_process, other_process, spanning_process, system_process]
 
         monkeypatch.setattr(psutil, "process_iter", mock_process_iter)
 
@@ -209,9 +445,48 @@ class TestMoveProcesses:
         assert other_process.affinity_calls[0] is None  # First call to get current affinity
         assert other_process.affinity_calls[1] == worker_cores  # Second call to set new affinity
 
+        # A process that also runs on worker cores should be left alone
+        assert spanning_process.affinity_calls == [None]
+
         # System process should be skipped
         assert len(system_process.affinity_calls) == 0
 
+    def test_move_processes_sched_affinity(self, monkeypatch):
+        """Test that affinities are read and set with the sched_*affinity syscalls when they are available."""
+
+        # Setup
+        class MockProcess:
+            def __init__(self, name, pid):
+                self.info = {"name": name, "pid": pid}
+                self.pid = pid
+
+            def cpu_affinity(self, new_affinity=None):  # pylint:disable=unused-argument
+                raise AssertionError("psutil should not be used")
+
+            def oneshot(self):
+                return contextlib.nullcontext()
+
+        affinities = {1000: {0, 1}, 1001: {0, 1, 2, 3}}
+        set_calls = []
+
+        def mock_sched_setaffinity(pid, cores):
+            set_calls.append((pid, list(cores)))
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_SCHED_AFFINITY", True)
+        monkeypatch.setattr(os, "sched_getaffinity", affinities.__getitem__, raising=False)
+        monkeypatch.setattr(os, "sched_setaffinity", mock_sched_setaffinity, raising=False)
+        monkeypatch.setattr(
+            psutil,
+            "process_iter",
+            lambda *args, **kwargs: [MockProcess("on_main.exe", 1000), MockProcess("all.exe", 1001)],
+        )
+
+        # Execute
+        move_processes_from_main_cores([0, 1], [2, 3])
+
+        # Verify
+        assert set_calls == [(1000, [2, 3])]
+
     def test_no_worker_cores(self, monkeypatch):
         """Test when no worker cores are available."""
         # Setup
@@ -233,42 +508,54 @@ class TestMoveProcesses:
         # Verify
         assert not process_iter_called  # Should exit early
 
+    def test_worker_cores_include_main_cores(self, monkeypatch):
+        """Test when the worker cores include all the main cores, so moving processes can't free them."""
+        # Setup
+        main_cores = [0, 1]
+        worker_cores = [0, 1, 2, 3]
+
+        process_iter_called = False
+
+        def mock_process_iter(*args, **kwargs):  # pylint:disable=unused-argument
+            nonlocal process_iter_called
+            process_iter_called = True
+            return []
+
+        monkeypatch.setattr(psutil, "process_iter", mock_process_iter)
+
+        # Execute
+        move_processes_from_main_cores(main_cores, worker_cores)
+
+        # Verify
+        assert not process_iter_called  # Should exit early
+
 
 class TestSetAffinities:
     """Tests for the set_affinities function."""
 
-    def test_set_affinities(self, monkeypatch):
+    def test_set_affinities(self, mock_process_table, monkeypatch):
         """Test setting affinities for main and worker processes."""
         # Setup
-        main_names = ["main.exe"]
-        worker_names = ["worker.exe"]
+        main_names = frozenset({"main.exe"})
+        worker_names = frozenset({"worker.exe"})
         main_cores = [0, 1]
         worker_cores = [2, 3]
 
         # Create mock processes
-        class MockProcess:
-            def __init__(self, name, pid):
-                self.info = {"name": name, "pid": pid}
-
-        # Create mock processes
-        main_process = MockProcess("main.exe", 1000)
-        worker_process = MockProcess("worker.exe", 1001)
-        other_process = MockProcess("other.exe", 1002)
-
-        def mock_process_iter(*args, **kwargs):  # pylint:disable=unused-argument
-            return [main_process, worker_process, other_process]
+        main_process = mock_process_table.start(1000, "main.exe")
+        worker_process = mock_process_table.start(1001, "worker.exe")
+        mock_process_table.start(1002, "other.exe")
 
         # Track calls to handle_main_process and handle_worker_process
         handle_main_calls = []
         handle_worker_calls = []
 
-        def mock_handle_main_process(proc, cores):
-            handle_main_calls.append((proc, cores))
+        def mock_handle_main_process(proc, cores, mask=None):
+            handle_main_calls.append((proc, cores, mask))
 
-        def mock_handle_worker_process(proc, cores):
-            handle_worker_calls.append((proc, cores))
+        def mock_handle_worker_process(proc, cores, mask=None):
+            handle_worker_calls.append((proc, cores, mask))
 
-        monkeypatch.setattr(psutil, "process_iter", mock_process_iter)
         monkeypatch.setattr("bas_set_cpu_affinity.core.handle_main_process", mock_handle_main_process)
         monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_worker_process)
 
@@ -281,41 +568,35 @@ class TestSetAffinities:
         assert len(handle_main_calls) == 1
         assert handle_main_calls[0][0] == main_process
         assert handle_main_calls[0][1] == main_cores
+        assert handle_main_calls[0][2] == cores_to_mask(main_cores)
         assert len(handle_worker_calls) == 1
         assert handle_worker_calls[0][0] == worker_process
         assert handle_worker_calls[0][1] == worker_cores
+        assert handle_worker_calls[0][2] == cores_to_mask(worker_cores)
 
-    def test_no_processes_found(self, monkeypatch):
+    def test_no_processes_found(self, mock_process_table, monkeypatch):
         """Test when no matching processes are found."""
         # Setup
-        main_names = ["nonexistent.exe"]
-        worker_names = ["alsonotfound.exe"]
+        main_names = frozenset({"nonexistent.exe"})
+        worker_names = frozenset({"alsonotfound.exe"})
         main_cores = [0, 1]
         worker_cores = [2, 3]
 
-        # Create mock processes with non-matching names
-        class MockProcess:
-            def __init__(self, name, pid):
-                self.info = {"name": name, "pid": pid}
-
-        process = MockProcess("other.exe", 1000)
-
-        def mock_process_iter(*args, **kwargs):  # pylint:disable=unused-argument
-            return [process]
+        # Create a mock process with a non-matching name
+        mock_process_table.start(1000, "other.exe")
 
         # Track calls to handle_main_process and handle_worker_process
         handle_main_called = False
         handle_worker_called = False
 
-        def mock_handle_main_process(proc, cores):  # pylint:disable=unused-argument
+        def mock_handle_main_process(proc, cores, mask=None):  # pylint:disable=unused-argument
             nonlocal handle_main_called
             handle_main_called = True
 
-        def mock_handle_worker_process(proc, cores):  # pylint:disable=unused-argument
+        def mock_handle_worker_process(proc, cores, mask=None):  # pylint:disable=unused-argument
             nonlocal handle_worker_called
             handle_worker_called = True
 
-        monkeypatch.setattr(psutil, "process_iter", mock_process_iter)
         monkeypatch.setattr("bas_set_cpu_affinity.core.handle_main_process", mock_handle_main_process)
         monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_worker_process)
 
@@ -328,6 +609,394 @@ class TestSetAffinities:
         assert not handle_main_called
         assert not handle_worker_called
 
+    def test_names_given_as_string(self, mock_process_table, monkeypatch, caplog):
+        """Test that process names given as a comma-separated string or a list are parsed like parse_names does."""
+        # Setup
+        mock_process_table.start(1000, "Worker.exe")
+        handled_pids = []
+
+        def mock_handle_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled_pids.append(proc.pid)
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_process)
+
+        # Execute
+        main_found, worker_found = set_affinities("Main.exe, BAS.exe", ["worker.exe"], [0, 1], [2, 3])
+
+        # Verify
+        assert main_found is False
+        assert worker_found is True
+        assert handled_pids == [1000]
+        assert "No main processes found matching: ['bas.exe', 'main.exe']" in caplog.text
+
+    def test_names_given_as_set(self, mock_process_table, monkeypatch):
+        """Test that process names given as a set are normalised too."""
+        # Setup
+        mock_process_table.start(1000, "Worker.exe")
+        handled_pids = []
+
+        def mock_handle_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled_pids.append(proc.pid)
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_process)
+
+        # Execute
+        main_found, worker_found = set_affinities(frozenset(), frozenset({" Worker.exe"}), [0, 1], [2, 3])
+
+        # Verify
+        assert main_found is False
+        assert worker_found is True
+        assert handled_pids == [1000]
+
+    def test_process_exits_while_handled(self, mock_process_table, monkeypatch):
+        """Test that a process exiting while it is handled is evicted without affecting the other processes."""
+        # Setup
+        mock_process_table.start(1000, "main.exe")
+        mock_process_table.start(1001, "worker.exe")
+        mock_process_table.start(1002, "worker.exe")
+
+        def mock_handle_main_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            raise psutil.NoSuchProcess(proc.pid)
+
+        handled_worker_pids = []
+
+        def mock_handle_worker_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled_worker_pids.append(proc.pid)
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_main_process", mock_handle_main_process)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_worker_process)
+
+        # Execute
+        main_found, worker_found = set_affinities(frozenset({"main.exe"}), frozenset({"worker.exe"}), [0, 1], [2, 3])
+        set_affinities(frozenset({"main.exe"}), frozenset({"worker.exe"}), [0, 1], [2, 3])
+
+        # Verify
+        assert main_found is False
+        assert worker_found is True
+        assert sorted(handled_worker_pids) == [1001, 1001, 1002, 1002]
+        assert mock_process_table.resolved.count(1000) == 2  # The exited process is resolved again on the next poll
+        assert mock_process_table.resolved.count(1001) == 1
+
+    def test_name_listed_as_main_and_worker(self, mock_process_table, monkeypatch):
+        """Test that a process whose name is listed as both main and worker is handled as a main process."""
+        # Setup
+        mock_process_table.start(1000, "both.exe")
+        handled = []
+
+        def mock_handle_main_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled.append(("main", proc.pid))
+
+        def mock_handle_worker_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled.append(("worker", proc.pid))
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_main_process", mock_handle_main_process)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_worker_process)
+
+        # Execute
+        main_found, worker_found = set_affinities(frozenset({"both.exe"}), frozenset({"both.exe"}), [0, 1], [2, 3])
+
+        # Verify
+        assert main_found is True
+        assert worker_found is False
+        assert handled == [("main", 1000)]
+
+    def test_process_cache_between_polls(self, mock_process_table, monkeypatch):
+        """Test that only new PIDs are resolved and that exited PIDs are dropped between polls."""
+        # Setup
+        main_names = frozenset({"main.exe"})
+        worker_names = frozenset({"worker.exe"})
+        main_cores = [0, 1]
+        worker_cores = [2, 3]
+
+        mock_process_table.start(1000, "main.exe")
+        mock_process_table.start(1001, "worker.exe")
+        handled_pids = []
+
+        def mock_handle_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled_pids.append(proc.pid)
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_main_process", mock_handle_process)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_process)
+
+        # Execute
+        set_affinities(main_names, worker_names, main_cores, worker_cores)
+        del mock_process_table[1001]
+        mock_process_table.start(1002, "worker.exe")
+        handled_pids.clear()
+        main_found, worker_found = set_affinities(main_names, worker_names, main_cores, worker_cores)
+
+        # Verify
+        assert main_found is True
+        assert worker_found is True
+        assert mock_process_table.resolved == [1000, 1001, 1002]  # PID 1000 is resolved only once
+        assert sorted(handled_pids) == [1000, 1002]  # PID 1001 has exited and is no longer handled
+
+    def test_process_handles_between_polls(self, mock_process_table, monkeypatch):
+        """Test that a process handle is opened once, reused across polls and closed when the process exits."""
+        # Setup
+        opened_pids = []
+        closed_handles = []
+
+        class MockKernel32:
+            def OpenProcess(self, access, inherit, pid):  # pylint:disable=unused-argument
+                opened_pids.append(pid)
+                return pid + 1
+
+            def GetProcessAffinityMask(self, handle, process_mask, system_mask):  # pylint:disable=unused-argument
+                # All cores, so the first poll has to update the affinity
+                ctypes.cast(process_mask, ctypes.POINTER(ctypes.c_size_t))[0] = 0b1111
+                return True
+
+            def SetProcessAffinityMask(self, handle, mask):  # pylint:disable=unused-argument
+                return True
+
+            def CloseHandle(self, handle):
+                closed_handles.append(handle)
+                return True
+
+        mock_process_table.start(1000, "worker.exe")
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_WIN32_API", True)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._kernel32", MockKernel32)
+
+        # Execute
+        set_affinities(frozenset(), frozenset({"worker.exe"}), [0, 1], [2, 3])
+        set_affinities(frozenset(), frozenset({"worker.exe"}), [0, 1], [2, 3])
+        opened_while_running = list(opened_pids)
+        del mock_process_table[1000]
+        set_affinities(frozenset(), frozenset({"worker.exe"}), [0, 1], [2, 3])
+
+        # Verify
+        assert opened_while_running == [1000]  # The affinity was read and set through a single handle
+        assert closed_handles == [1001]
+
+    def test_process_names_from_procfs(self, mock_process_table, monkeypatch):
+        """Test that names are read from /proc and Process objects are only created for matching processes."""
+        # Setup
+        mock_process_table.start(1000, "main.exe")
+        mock_process_table.start(1001, "other")
+        mock_process_table.start(1002, "a-very-long-name.exe")
+
+        def mock_read_comm(pid):
+            name = mock_process_table[pid].process_name[:15]  # The kernel truncates longer names
+            return name if len(name) < 15 else None
+
+        handled_pids = []
+
+        def mock_handle_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled_pids.append(proc.pid)
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_PROCFS", True)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._read_comm", mock_read_comm)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_main_process", mock_handle_process)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_process)
+
+        # Execute
+        main_found, worker_found = set_affinities(
+            frozenset({"main.exe"}), frozenset({"a-very-long-name.exe"}), [0, 1], [2, 3]
+        )
+
+        # Verify
+        assert main_found is True
+        assert worker_found is True
+        assert sorted(handled_pids) == [1000, 1002]
+        assert sorted(mock_process_table.resolved) == [1000, 1002]  # No Process object for the non-matching process
+
+    def test_process_names_from_nt_process_list(self, mock_process_table, monkeypatch):
+        """Test that names come from the native process list and Process objects are only created when needed."""
+        # Setup
+        mock_process_table.start(0, "System Idle Process")
+        mock_process_table.start(4, "System")
+        mock_process_table.start(1000, "main.exe")
+        mock_process_table.start(1001, "other.exe")
+        handled_pids = []
+
+        def mock_handle_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled_pids.append(proc.pid)
+
+        def mock_pids():
+            raise AssertionError("psutil.pids() should not be called")
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_NT_PROCESS_LIST", True)
+        monkeypatch.setattr(
+            "bas_set_cpu_affinity.core._list_processes_nt", lambda: {**mock_process_table.names(), 0: ""}
+        )
+        monkeypatch.setattr(psutil, "pids", mock_pids)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_main_process", mock_handle_process)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_process)
+
+        # Execute
+        main_found, worker_found = set_affinities(frozenset({"main.exe"}), frozenset({"worker.exe"}), [0, 1], [2, 3])
+
+        # Verify
+        assert main_found is True
+        assert worker_found is False
+        assert handled_pids == [1000]
+        assert sorted(mock_process_table.resolved) == [0, 1000]  # Only the nameless idle process is resolved by psutil
+
+    @pytest.mark.skipif(ctypes.sizeof(ctypes.c_void_p) != 8, reason="64-bit structure layout")
+    def test_nt_process_list_parsing(self, mock_process_table, monkeypatch):
+        """Test that the PIDs and names are parsed from the SYSTEM_PROCESS_INFORMATION entries of the native call."""
+        # Setup
+        entries = [(0, ""), (4, "System"), (1000, "Main.exe")]
+        calls = []
+
+        class MockNtdll:
+            def NtQuerySystemInformation(
+                self, information_class, buffer, length, return_length
+            ):  # pylint:disable=unused-argument
+                calls.append(information_class)
+                if len(calls) == 1:
+                    return 0xC0000004  # STATUS_INFO_LENGTH_MISMATCH, the call is retried with a larger buffer
+
+                # Each entry is followed by its image name, at the offsets of the 64-bit structure layout
+                offset = 0
+                for index, (pid, name) in enumerate(entries):
+                    image_name = name.encode("utf-16-le")
+                    size = (96 + len(image_name) + 7) // 8 * 8
+                    name_address = ctypes.addressof(buffer) + offset + 96 if name else 0
+                    struct.pack_into("<I", buffer, offset, size if index < len(entries) - 1 else 0)
+                    struct.pack_into("<HH4xQ", buffer, offset + 56, len(image_name), len(image_name), name_address)
+                    struct.pack_into("<Q", buffer, offset + 80, pid)
+                    struct.pack_into(f"<{len(image_name)}s", buffer, offset + 96, image_name)
+                    offset += size
+                return 0
+
+        mock_process_table.start(0, "System Idle Process")
+        mock_process_table.start(1000, "Main.exe")
+        handled_pids = []
+
+        def mock_handle_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled_pids.append(proc.pid)
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_NT_PROCESS_LIST", True)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._ntdll", MockNtdll)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_main_process", mock_handle_process)
+
+        # Execute
+        main_found, worker_found = set_affinities(frozenset({"main.exe"}), frozenset({"worker.exe"}), [0, 1], [2, 3])
+
+        # Verify
+        assert main_found is True
+        assert worker_found is False
+        assert calls == [5, 5]  # SystemProcessInformation
+        assert handled_pids == [1000]
+        assert mock_process_table.resolved == [0, 1000]  # Only the nameless idle process is resolved by psutil
+
+    def test_nt_process_list_failure(self, mock_process_table, monkeypatch):
+        """Test that psutil is used to list processes when the native call fails."""
+
+        # Setup
+        def mock_list_processes_nt():
+            raise OSError("NtQuerySystemInformation failed with status 0xc0000022")
+
+        mock_process_table.start(1000, "main.exe")
+        handled_pids = []
+
+        def mock_handle_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled_pids.append(proc.pid)
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_NT_PROCESS_LIST", True)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._list_processes_nt", mock_list_processes_nt)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_main_process", mock_handle_process)
+
+        # Execute
+        main_found, _ = set_affinities(frozenset({"main.exe"}), frozenset({"worker.exe"}), [0, 1], [2, 3])
+
+        # Verify
+        assert main_found is True
+        assert handled_pids == [1000]
+
+    def test_reused_pid_from_nt_process_list(self, mock_process_table, monkeypatch):
+        """Test that a PID reused by a process with another name is resolved again."""
+        # Setup
+        mock_process_table.start(1000, "notepad.exe")
+        handled_pids = []
+
+        def mock_handle_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled_pids.append(proc.pid)
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_NT_PROCESS_LIST", True)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._list_processes_nt", mock_process_table.names)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_process)
+
+        # Execute
+        first_found = set_affinities(frozenset({"main.exe"}), frozenset({"worker.exe"}), [0, 1], [2, 3])
+        mock_process_table.start(1000, "Worker.exe")  # notepad.exe exited and its PID was reused
+        second_found = set_affinities(frozenset({"main.exe"}), frozenset({"worker.exe"}), [0, 1], [2, 3])
+
+        # Verify
+        assert first_found == (False, False)
+        assert second_found == (False, True)
+        assert handled_pids == [1000]
+
+    def test_exec_from_procfs(self, mock_process_table, monkeypatch):
+        """Test that a process calling exec is matched under its new name."""
+        # Setup
+        child = mock_process_table.start(1000, "python")
+        handled_pids = []
+
+        def mock_handle_process(proc, cores, mask=None):  # pylint:disable=unused-argument
+            handled_pids.append(proc.pid)
+
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_PROCFS", True)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._read_comm", lambda pid: mock_process_table[pid].process_name)
+        monkeypatch.setattr("bas_set_cpu_affinity.core.handle_worker_process", mock_handle_process)
+
+        # Execute
+        first_found = set_affinities(frozenset({"main.exe"}), frozenset({"sleep"}), [0, 1], [2, 3])
+        child.process_name = "sleep"  # The forked child called exec
+        second_found = set_affinities(frozenset({"main.exe"}), frozenset({"sleep"}), [0, 1], [2, 3])
+
+        # Verify
+        assert first_found == (False, False)
+        assert second_found == (False, True)
+        assert handled_pids == [1000]
+
+
+class TestReconcile:
+    """Tests for the reconcile function."""
+
+    def test_reconcile(self, mock_process_table):
+        """Test that managed processes are handled and other processes are moved off the main cores in one pass."""
+        # Setup
+        mock_process_table.start(4, "System", [0, 1])
+        mock_process_table.start(1000, "main.exe", [0, 1, 2, 3])
+        mock_process_table.start(1001, "worker.exe", [0, 1, 2, 3])
+        mock_process_table.start(1002, "on_main.exe", [1, 0])
+        mock_process_table.start(1003, "spanning.exe", [0, 1, 2])
+
+        # Execute
+        main_found, worker_found = reconcile(frozenset({"main.exe"}), frozenset({"worker.exe"}), [0, 1], [2, 3], [0, 1])
+
+        # Verify
+        assert main_found is True
+        assert worker_found is True
+        assert mock_process_table[4].cpu_affinity() == [0, 1]  # System processes are never moved
+        assert mock_process_table[1000].cpu_affinity() == [0, 1]
+        assert mock_process_table[1001].cpu_affinity() == [2, 3]
+        assert mock_process_table[1002].cpu_affinity() == [
+            2,
+            3,
+        ]  # Ran only on the main cores, moved to the worker cores
+        assert mock_process_table[1003].cpu_affinity() == [0, 1, 2]  # Also runs on a worker core, left alone
+
+    def test_moved_processes_not_cached(self, mock_process_table, monkeypatch):
+        """Test that the Process objects created to move processes aren't kept between polls."""
+        # Setup
+        mock_process_table.start(1000, "main.exe", [0, 1, 2, 3])
+        mock_process_table.start(1001, "on_main.exe", [0, 1])
+        monkeypatch.setattr("bas_set_cpu_affinity.core._USE_PROCFS", True)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._read_comm", lambda pid: mock_process_table[pid].process_name)
+
+        # Execute
+        reconcile(frozenset({"main.exe"}), frozenset({"worker.exe"}), [0, 1], [2, 3], [0, 1])
+        reconcile(frozenset({"main.exe"}), frozenset({"worker.exe"}), [0, 1], [2, 3], [0, 1])
+
+        # Verify
+        assert mock_process_table[1001].cpu_affinity() == [2, 3]
+        assert mock_process_table.resolved.count(1000) == 1  # The main process is cached
+        assert mock_process_table.resolved.count(1001) == 2  # The moved process is resolved again for each move
+
 
 class TestCheckSingleInstance:
     """Tests for the check_single_instance function."""
@@ -336,20 +1005,13 @@ class TestCheckSingleInstance:
         """Test when no other instance is running."""
         # Setup
         create_mutex_called = False
-        get_last_error_called = False
 
         def mock_create_mutex(*args, **kwargs):  # pylint:disable=unused-argument
             nonlocal create_mutex_called
             create_mutex_called = True
-            return "mock_mutex"
-
-        def mock_get_last_error():
-            nonlocal get_last_error_called
-            get_last_error_called = True
-            return 0  # No error
+            return "mock_mutex", False  # The mutex didn't exist yet
 
-        monkeypatch.setattr(win32event, "CreateMutex", mock_create_mutex)
-        monkeypatch.setattr(win32api, "GetLastError", mock_get_last_error)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._create_mutex", mock_create_mutex)
 
         # Execute
         result = check_single_instance()
@@ -357,25 +1019,18 @@ class TestCheckSingleInstance:
         # Verify
         assert result == "mock_mutex"
         assert create_mutex_called
-        assert get_last_error_called
 
     def test_other_instance_running(self, monkeypatch):
         """Test when another instance is already running."""
         # Setup
         create_mutex_called = False
-        get_last_error_called = False
         message_box_called = False
         exit_called = False
 
         def mock_create_mutex(*args, **kwargs):  # pylint:disable=unused-argument
             nonlocal create_mutex_called
             create_mutex_called = True
-            return "mock_mutex"
-
-        def mock_get_last_error():
-            nonlocal get_last_error_called
-            get_last_error_called = True
-            return winerror.ERROR_ALREADY_EXISTS
+            return "mock_mutex", True  # The mutex already existed
 
         def mock_message_box(*args, **kwargs):  # pylint:disable=unused-argument
             nonlocal message_box_called
@@ -388,9 +1043,8 @@ class TestCheckSingleInstance:
             # Raise an exception to prevent actual exit
             raise RuntimeError("Exit called")
 
-        monkeypatch.setattr(win32event, "CreateMutex", mock_create_mutex)
-        monkeypatch.setattr(win32api, "GetLastError", mock_get_last_error)
-        monkeypatch.setattr(win32ui, "MessageBox", mock_message_box)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._create_mutex", mock_create_mutex)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._message_box", mock_message_box)
         monkeypatch.setattr(sys, "exit", mock_exit)
 
         # Execute
@@ -400,7 +1054,6 @@ class TestCheckSingleInstance:
 
         # Verify
         assert create_mutex_called
-        assert get_last_error_called
         assert message_box_called
         assert exit_called  # This is the key assertion - sys.exit should have been called
 
@@ -416,8 +1069,8 @@ class TestCheckSingleInstance:
             nonlocal message_box_called
             message_box_called = True
 
-        monkeypatch.setattr(win32event, "CreateMutex", mock_create_mutex)
-        monkeypatch.setattr(win32ui, "MessageBox", mock_message_box)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._create_mutex", mock_create_mutex)
+        monkeypatch.setattr("bas_set_cpu_affinity.core._message_box", mock_message_box)
 
         # Execute
         result = check_single_instance()
@@ -425,3 +1078,63 @@ class TestCheckSingleInstance:
         # Verify
         assert result is None
         assert message_box_called
+
+
+class TestWaitForProcessExit:
+    """Tests for the wait_for_process_exit function."""
+
+    def test_sleeps_without_tracked_processes(self, monkeypatch):
+        """Test that the whole timeout is slept when no process is tracked."""
+        # Setup
+        sleep_seconds = None
+
+        def mock_sleep(seconds):
+            nonlocal sleep_seconds
+            sleep_seconds = seconds
+
+        monkeypatch.setattr(time, "sleep", mock_sleep)
+
+        # Execute
+        result = wait_for_process_exit(5.0)
+
+        # Verify
+        assert not result
+        assert sleep_seconds == 5.0
+
+    @pytest.mark.skipif(
+        not sys.platform.startswith("linux") or not hasattr(os, "pidfd_open"), reason="Linux pidfd-specific test"
+    )
+    def test_wakes_up_when_tracked_process_exits(self, mock_process):
+        """Test that the wait returns as soon as a tracked process exits."""
+        # Setup
+        with subprocess.Popen([sys.executable, "-c", "import time; time.sleep(0.2)"]) as child:
+            mock_process.pid = child.pid
+            handle_worker_process(mock_process, [0, 1])  # Tracks the process
+
+            # Execute
+            started = time.monotonic()
+            result = wait_for_process_exit(30.0)
+
+            # Verify
+            assert result == [child.pid]
+            assert time.monotonic() - started < 10.0
+
+    @pytest.mark.skipif(
+        not sys.platform.startswith("linux") or not hasattr(os, "pidfd_open"), reason="Linux pidfd-specific test"
+    )
+    def test_exited_process_not_reaped(self):
+        """Test that a process that exited but wasn't reaped yet doesn't wake the wait again."""
+        # Setup
+        with subprocess.Popen(["sleep", "0.2"]) as child:
+            set_affinities(frozenset(), frozenset({"sleep"}), [0], [0])  # Tracks the process
+            assert wait_for_process_exit(30.0) == [child.pid]  # The process exits, but it is still listed
+
+            # Execute
+            set_affinities(frozenset(), frozenset({"sleep"}), [0], [0])
+            started = time.monotonic()
+            result = wait_for_process_exit(0.5)
+            elapsed = time.monotonic() - started
+
+        # Verify
+        assert not result
+        assert elapsed >= 0.4